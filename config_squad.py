@@ -15,36 +15,22 @@ from sys import argv,exit,version_info
 from time import ctime,time
 from ConfigParser import SafeConfigParser
 
-###########################################################
-## reading parameters from command line ###################
-
-U      = float(argv[1])
-Delta  = float(argv[2])
-GammaR = float(argv[3])
-GammaL = float(argv[4])*GammaR
-eps    = float(argv[5])
-P      = float(argv[6])
-GammaN = 0.0 	 ## for compatibility with functions from SSN branch (not in GitHub master branch)
-
-## little post-processing
-ed       = eps-U/2.0                               ## energy level shifted to symmetry point
-Phi      = P*sp.pi                                 ## phase difference
-GammaLR  = GammaL/GammaR if GammaR != 0.0 else 1.0 ## coupling strength ratio
-GammaTot = GammaL + GammaR                         ## total coupling strength
+#############################
+##### List of functions: ####
+# ReadConfig
+# CheckChoices
+# ReadArgv
+# PhysParams
+# EnergyGrid
+# BandEdges
 
-###########################################################
-## reading config file ####################################
+## Nothing is read from the command line on import. The physical parameters
+## and the energy axis are set up by PhysParams and EnergyGrid and pushed
+## to the libraries by SquadSolver (squadsolver.py).
 
 cfile = 'squad.in'
 
-if cfile not in listdir('.'): 
-	print('- Parameter file '+cfile+' missing. Exit.')
-	exit(1)
-
-config = SafeConfigParser()
-config.optionxform = str    ## case-sensitive names
-config.read(cfile)
-
+###########################################################
 ## default values #########################################
 ## consult infile.md for details
 
@@ -58,9 +44,21 @@ MuMin        = -2.0
 MuMax        = 2.0
 ABSinit_val  = 0.99
 HF_max_iter  = 10000
+HFmethod     = 'fixed_point' ## fixed_point, hybr, broyden1 or anderson
+HFgrid       = 'graded'    ## band grid for HF Matsubara sums, graded or uniform
+HFpoints     = 10001
 offset_x     = 1e-12
+FFTbackend   = 'numpy'     ## numpy, scipy, pyfftw, fftpack or auto
+FFTworkers   = 1
+WarmWidth    = 0.02        ## initial half-width of the brentq interval in continuation
+Precision    = 'double'    ## storage of Green functions and self-energies, double or single
+RefineLevels = 3           ## number of grids M-RefineLevels+1..M of secondPT.py --refine
+RefineTol    = 0.0         ## tolerance of --refine, 0 = all levels
+PhaseBatch   = 8           ## phases per batched pass of SquadSolver.RunPhases
+KKpoles      = 0           ## ABS delta peaks subtracted before the KK transforms, 0 or 1
+PHsymmetry   = 1           ## particle-hole symmetry used at half-filling (eps = 0), 0 or 1
 
-WriteIO      = 1
+chat         = True
 Write_HFGF   = 0
 Write_Bubble = 0
 Write_2ndSE  = 0
@@ -68,81 +66,191 @@ Write_2ndGF  = 1
 Write_AC     = 0           ## Andreev conductance, for compatibility with SSN codes
 EmaxFiles    = 10.0
 EstepFiles   = 10
+WriteFormat  = 'dat'       ## dat (text) or npz (NumPy binary)
+KernelDir    = ''          ## directory for the Kramers-Kronig kernel files, '' = no files
+WisdomFile   = ''          ## pyFFTW wisdom file, '' = no file
+CacheDir     = ''          ## directory of the results cache, '' = no cache
+CacheSize    = 1000.0      ## cache size limit in MB
+CacheArrays  = 0           ## store also the self-energies in cache
+CacheSeed    = 0.0         ## max. distance in (eps,P) of a cached starting point, 0 = no seeding
+CheckpointDir = ''         ## directory of the checkpoints, '' = no checkpoints
+ProfFile     = ''          ## JSON records of timings and call counts, '' = no file
+ProfDump     = ''          ## cProfile statistics of secondPT.py, '' = no profiling
+
+## allowed values of the options with a fixed set of values
+Choices_D = {'rootf': ['brentq','fixed_point','hybr','broyden1','anderson'],\
+'HFmethod': ['fixed_point','hybr','broyden1','anderson'], 'HFgrid': ['graded','uniform'],\
+'FFTbackend': ['numpy','scipy','pyfftw','fftpack','auto'], 'Precision': ['double','single'],\
+'WriteFormat': ['dat','npz']}
+
+###########################################################
+## reading config file ####################################
 
-## read the .in file ######################################
-
-## [params] section
-if config.has_option('params','M'):
-	M            = int(config.get('params','M'))
-if config.has_option('params','dE'):
-	dE           = float(config.get('params','dE'))
-if config.has_option('params','rootf'):
-	rootf        = str(config.get('params','rootf'))
-if config.has_option('params','ConvN'):
-	ConvN        = float(config.get('params','ConvN'))
-if config.has_option('params','ConvX'):
-	ConvX        = float(config.get('params','ConvX'))
-if config.has_option('params','ConvHF'):
-	ConvHF       = float(config.get('params','ConvHF'))
-if config.has_option('params','MuMin'):
-	MuMin        = float(config.get('params','MuMin'))
-if config.has_option('params','MuMax'):
-	MuMax        = float(config.get('params','MuMax'))
-if config.has_option('params','ABSinit_val'):
-	ABSinit_val  = float(config.get('params','ABSinit_val'))
-if config.has_option('params','HF_max_iter'):
-	HF_max_iter  = int(config.get('params','HF_max_iter'))
-if config.has_option('params','offset_x'):
-	offset_x     = float(config.get('params','offset_x'))
-
-## [IO] section
-if config.has_option('IO','WriteIO'):
-	chat         = bool(int(config.get('IO','WriteIO')))
-if config.has_option('IO','Write_HFGF'):
-	Write_HFGF   = bool(int(config.get('IO','Write_HFGF')))
-if config.has_option('IO','Write_Bubble'):
-	Write_Bubble = bool(int(config.get('IO','Write_Bubble')))
-if config.has_option('IO','Write_2ndSE'):
-	Write_2ndSE  = bool(int(config.get('IO','Write_2ndSE')))
-if config.has_option('IO','Write_2ndGF'):
-	Write_2ndGF  = bool(int(config.get('IO','Write_2ndGF')))
-if config.has_option('IO','Write_AC'):
-	Write_AC     = bool(int(config.get('IO','Write_AC')))		## compatibility with SSN codes
-if config.has_option('IO','EmaxFiles'):
-	EmaxFiles    = float(config.get('IO','EmaxFiles'))
-if config.has_option('IO','EstepFiles'):
-	EstepFiles   = int(config.get('IO','EstepFiles'))
+def ReadConfig(cfile):
+	""" reads the [params] and [IO] sections of the config file to global variables """
+	global M,dE,rootf,ConvN,ConvX,ConvHF,MuMin,MuMax,ABSinit_val,HF_max_iter,HFmethod,HFgrid,HFpoints,offset_x,FFTbackend,FFTworkers,WarmWidth,Precision,RefineLevels,RefineTol,PhaseBatch,KKpoles,PHsymmetry
+	global chat,Write_HFGF,Write_Bubble,Write_2ndSE,Write_2ndGF,Write_AC,EmaxFiles,EstepFiles,WriteFormat,KernelDir,WisdomFile,CacheDir,CacheSize,CacheArrays,CacheSeed,CheckpointDir,ProfFile,ProfDump
+	config = SafeConfigParser()
+	config.optionxform = str    ## case-sensitive names
+	config.read(cfile)
+	## [params] section
+	if config.has_option('params','M'):
+		M            = int(config.get('params','M'))
+	if config.has_option('params','dE'):
+		dE           = float(config.get('params','dE'))
+	if config.has_option('params','rootf'):
+		rootf        = str(config.get('params','rootf'))
+	if config.has_option('params','ConvN'):
+		ConvN        = float(config.get('params','ConvN'))
+	if config.has_option('params','ConvX'):
+		ConvX        = float(config.get('params','ConvX'))
+	if config.has_option('params','ConvHF'):
+		ConvHF       = float(config.get('params','ConvHF'))
+	if config.has_option('params','MuMin'):
+		MuMin        = float(config.get('params','MuMin'))
+	if config.has_option('params','MuMax'):
+		MuMax        = float(config.get('params','MuMax'))
+	if config.has_option('params','ABSinit_val'):
+		ABSinit_val  = float(config.get('params','ABSinit_val'))
+	if config.has_option('params','HF_max_iter'):
+		HF_max_iter  = int(config.get('params','HF_max_iter'))
+	if config.has_option('params','HFmethod'):
+		HFmethod     = str(config.get('params','HFmethod'))
+	if config.has_option('params','HFgrid'):
+		HFgrid       = str(config.get('params','HFgrid'))
+	if config.has_option('params','HFpoints'):
+		HFpoints     = int(config.get('params','HFpoints'))
+	if config.has_option('params','offset_x'):
+		offset_x     = float(config.get('params','offset_x'))
+	if config.has_option('params','FFTbackend'):
+		FFTbackend   = str(config.get('params','FFTbackend'))
+	if config.has_option('params','FFTworkers'):
+		FFTworkers   = int(config.get('params','FFTworkers'))
+	if config.has_option('params','WarmWidth'):
+		WarmWidth    = float(config.get('params','WarmWidth'))
+	if config.has_option('params','Precision'):
+		Precision    = str(config.get('params','Precision'))
+	if config.has_option('params','RefineLevels'):
+		RefineLevels = int(config.get('params','RefineLevels'))
+	if config.has_option('params','RefineTol'):
+		RefineTol    = float(config.get('params','RefineTol'))
+	if config.has_option('params','PhaseBatch'):
+		PhaseBatch   = int(config.get('params','PhaseBatch'))
+	if config.has_option('params','KKpoles'):
+		KKpoles      = int(config.get('params','KKpoles'))
+	if config.has_option('params','PHsymmetry'):
+		PHsymmetry   = int(config.get('params','PHsymmetry'))
+	## [IO] section
+	if config.has_option('IO','WriteIO'):
+		chat         = bool(int(config.get('IO','WriteIO')))
+	if config.has_option('IO','Write_HFGF'):
+		Write_HFGF   = bool(int(config.get('IO','Write_HFGF')))
+	if config.has_option('IO','Write_Bubble'):
+		Write_Bubble = bool(int(config.get('IO','Write_Bubble')))
+	if config.has_option('IO','Write_2ndSE'):
+		Write_2ndSE  = bool(int(config.get('IO','Write_2ndSE')))
+	if config.has_option('IO','Write_2ndGF'):
+		Write_2ndGF  = bool(int(config.get('IO','Write_2ndGF')))
+	if config.has_option('IO','Write_AC'):
+		Write_AC     = bool(int(config.get('IO','Write_AC')))		## compatibility with SSN codes
+	if config.has_option('IO','EmaxFiles'):
+		EmaxFiles    = float(config.get('IO','EmaxFiles'))
+	if config.has_option('IO','EstepFiles'):
+		EstepFiles   = int(config.get('IO','EstepFiles'))
+	if config.has_option('IO','WriteFormat'):
+		WriteFormat  = str(config.get('IO','WriteFormat'))
+	if config.has_option('IO','KernelDir'):
+		KernelDir    = str(config.get('IO','KernelDir'))
+	if config.has_option('IO','WisdomFile'):
+		WisdomFile   = str(config.get('IO','WisdomFile'))
+	if config.has_option('IO','CacheDir'):
+		CacheDir     = str(config.get('IO','CacheDir'))
+	if config.has_option('IO','CacheSize'):
+		CacheSize    = float(config.get('IO','CacheSize'))
+	if config.has_option('IO','CacheArrays'):
+		CacheArrays  = bool(int(config.get('IO','CacheArrays')))
+	if config.has_option('IO','CacheSeed'):
+		CacheSeed    = float(config.get('IO','CacheSeed'))
+	if config.has_option('IO','CheckpointDir'):
+		CheckpointDir = str(config.get('IO','CheckpointDir'))
+	if config.has_option('IO','ProfFile'):
+		ProfFile     = str(config.get('IO','ProfFile'))
+	if config.has_option('IO','ProfDump'):
+		ProfDump     = str(config.get('IO','ProfDump'))
+	CheckChoices(globals())
+
+
+def CheckChoices(Options_D):
+	""" raises ValueError if an option of Choices_D in the dictionary Options_D has another value """
+	for name in sorted(Choices_D):
+		if name in Options_D and Options_D[name] not in Choices_D[name]:
+			raise ValueError('# CheckChoices: Error: '+name+' = '+str(Options_D[name])+' is not one of: '\
+			+', '.join(Choices_D[name])+'.')
+
+## the file is optional when the code is used as a library,
+## secondPT.py checks for it itself
+if cfile in listdir('.'): ReadConfig(cfile)
+
+###########################################################
+## physical parameters ####################################
+
+def ReadArgv(argv):
+	""" reads U, Delta, GammaR, GammaL/GammaR, eps, P from command line
+	    returns the PhysParams dictionary """
+	U      = float(argv[1])
+	Delta  = float(argv[2])
+	GammaR = float(argv[3])
+	GammaL = float(argv[4])*GammaR
+	eps    = float(argv[5])
+	P      = float(argv[6])
+	return PhysParams(U,Delta,GammaR,GammaL,eps,P)
+
+
+def PhysParams(U,Delta,GammaR,GammaL,eps,P):
+	""" dictionary of physical parameters and derived quantities,
+	    GammaL is the coupling itself, not the ratio GammaL/GammaR """
+	if any([GammaL <= 0.0,GammaR <= 0.0, U < 0.0, Delta <= 0.0]):
+		raise ValueError('# check_params: Error: All of GammaL, GammaR, U, Delta must be positive.')
+	Params = {'U': U, 'Delta': Delta, 'GammaR': GammaR, 'GammaL': GammaL, 'eps': eps, 'P': P}
+	Params['GammaN']   = 0.0                                ## for compatibility with functions from SSN branch
+	## little post-processing
+	Params['ed']       = eps-U/2.0                          ## energy level shifted to symmetry point
+	Params['Phi']      = P*sp.pi                            ## phase difference
+	Params['GammaLR']  = GammaL/GammaR if GammaR != 0.0 else 1.0 ## coupling strength ratio
+	Params['GammaTot'] = GammaL + GammaR                    ## total coupling strength
+	return Params
 
 ###########################################################
 ## energy axis ############################################
 
-## In case you run into RuntimeWarning: invalid value encountered in power:
-## for Kramers-Kronig we need range(N)**3 array, for large N it can 
-## hit the limit of 2**63 = 9223372036854775808 of signed int
-## large values of N also introduce instability to calcualtion of ABS
-N      = 2**M-1	## number of points for bubble/self-energy FFT calculation
-dE_dec = int(-sp.log10(dE))
-En_A   = sp.around(sp.linspace(-(N-1)/2*dE,(N-1)/2*dE,N),dE_dec+2)
-Nhalf  = int((len(En_A)-1)/2)	## zero on the energy axis
-
-## cannot print what is not calculated
-if EmaxFiles > sp.fabs(En_A[0]): EmaxFiles = sp.fabs(En_A[0])  
-
-if any([GammaL <= 0.0,GammaR <= 0.0, U < 0.0, Delta <= 0.0]):
-	print('# check_params: Error: All of GammaL, GammaR, U, Delta must be positive.')
-	exit(1)
-
-if Delta > En_A[-1]:
-	print('# Error: Delta must be smaller than the bandwidth.')
-	print('# Delta = {0: .5f}, Emax = {1: .5f}'.format(Delta,En_A[-1]))
-	exit(1)
-
-## locate band edges in En_A
-EdgePos1 = sp.nonzero(sp.around(En_A,dE_dec) == sp.around(-Delta,dE_dec))[0][0]
-EdgePos2 = sp.nonzero(sp.around(En_A,dE_dec) == sp.around( Delta,dE_dec))[0][0]
-
-## Fermi-Dirac distribution for T=0
-FD_A = 1.0*sp.concatenate([sp.ones(int((N-1)/2)),[0.5],sp.zeros(int((N-1)/2))])
+def EnergyGrid(M,dE):
+	""" energy axis and the Fermi-Dirac distribution,
+	    depend only on M and dE and can be shared between parameter sets """
+	## In case you run into RuntimeWarning: invalid value encountered in power:
+	## for Kramers-Kronig we need range(N)**3 array, for large N it can
+	## hit the limit of 2**63 = 9223372036854775808 of signed int
+	## large values of N also introduce instability to calcualtion of ABS
+	N      = 2**M-1	## number of points for bubble/self-energy FFT calculation
+	dE_dec = int(-sp.log10(dE))
+	En_A   = sp.around(sp.linspace(-(N-1)/2*dE,(N-1)/2*dE,N),dE_dec+2)
+	Nhalf  = int((len(En_A)-1)/2)	## zero on the energy axis
+	## Fermi-Dirac distribution for T=0
+	FD_A = 1.0*sp.concatenate([sp.ones(int((N-1)/2)),[0.5],sp.zeros(int((N-1)/2))])
+	Grid = {'M': M, 'dE': dE, 'N': N, 'dE_dec': dE_dec, 'En_A': En_A, 'Nhalf': Nhalf, 'FD_A': FD_A}
+	## cannot print what is not calculated
+	Grid['EmaxFiles'] = min(EmaxFiles,sp.fabs(En_A[0]))
+	return Grid
+
+
+def BandEdges(Delta,Grid):
+	""" locate band edges in En_A """
+	[En_A,dE_dec] = [Grid['En_A'],Grid['dE_dec']]
+	if Delta > En_A[-1]:
+		raise ValueError('# Error: Delta must be smaller than the bandwidth.\n'\
+		+'# Delta = {0: .5f}, Emax = {1: .5f}'.format(Delta,En_A[-1]))
+	EdgePos1 = sp.nonzero(sp.around(En_A,dE_dec) == sp.around(-Delta,dE_dec))[0][0]
+	EdgePos2 = sp.nonzero(sp.around(En_A,dE_dec) == sp.around( Delta,dE_dec))[0][0]
+	return [EdgePos1,EdgePos2]
 
 ## config_squad.py end ##
 
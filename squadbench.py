@@ -0,0 +1,140 @@
+################################################################
+# SQUAD - superconducting quantum dot                          #
+# Copyright (C) 2012-2019  Vladislav Pokorny; pokornyv@fzu.cz  #
+# homepage: github.com/pokornyv/SQUAD                          #
+# squadbench.py - benchmark of speed and accuracy              #
+# method described in                                          #
+#    Sci. Rep. 5, 8821 (2015).                                 #
+#    Phys. Rev. B 93, 024523 (2016).                           #
+################################################################
+
+## usage: python squadbench.py [--M 16:20] [--ref squadbench.json] [--store] [--tol 1e-4] [--precision P] [-o file]
+## runs the solver over a fixed matrix of cases: M, weak and strong U/Gamma,
+## eps = 0 and eps != 0, P close to 0 and close to 1, and compares wABS, n, mu and JC
+## with the reference values stored in the --ref file, exit status 1 if they differ
+## by more than --tol. Wall times and call counts (squadprof.py) are compared too,
+## but only reported. --store writes the current results as new reference values.
+## The stored squadbench.json was calculated once by the original solver (M = 16 to 20,
+## times are whole runs of its secondPT.py) and is not meant to be rewritten by --store.
+## The other options (rootf, HFmethod, FFTbackend, ...) are read from squad.in.
+## --precision single runs the cases with single-precision storage, the deviations
+## from the (double-precision) reference are the accuracy cost of this option.
+
+from squadsolver import *
+from argparse import ArgumentParser
+import json
+
+#############################
+##### List of functions: ####
+# BenchCases
+# CaseName
+# BenchCase
+# BenchTolerance
+# BenchCompare
+
+## [U,GammaR,a] for weak and strong coupling, U/Gamma = 1 and 3
+Couplings_L = [[1.0,0.5,1.0],[3.0,0.5,1.0]]
+Levels_L    = [0.0,0.5]
+Phases_L    = [0.001,0.999]
+Delta_bench = 1.0
+
+## compared results
+BenchResults_L = ['wABS','n','mu','JC']
+
+## [eps,P] of the cases with the ABS within dE of zero: the ABS residues are then 0/0
+## and JC is set by roundoff (the reference gives -0.160 to -0.246 for U = 1, M = 16 to 20),
+## JC is compared with the looser tolerance tolJC_pinned, wABS, n and mu with --tol
+Pinned_L = [[0.0,0.999]]
+tolJC_pinned = 0.1
+
+
+def BenchCases():
+	""" list of the physical parameters of the benchmark, without M """
+	return [PhysParams(U,Delta_bench,GammaR,a*GammaR,eps,P)\
+	for [U,GammaR,a] in Couplings_L for eps in Levels_L for P in Phases_L]
+
+
+def CaseName(M,Params):
+	""" key of the case in the reference file """
+	return 'M={0:d} U={1:.3f} GammaR={2:.3f} GammaL={3:.3f} eps={4:.3f} P={5:.3f}'\
+	.format(M,Params['U'],Params['GammaR'],Params['GammaL'],Params['eps'],Params['P'])
+
+
+def BenchCase(Solver,Params):
+	""" runs a single case, returns a dictionary of results and timings """
+	t = time()
+	try:
+		Results = Solver.Run(Params)
+	except (RuntimeError,ValueError,SystemExit) as err:
+		return {'failed': str(err), 'time': time()-t}
+	## the values printed by secondPT.py
+	Case_D = {'wABS': float(Results['wzero']), 'n': float(Results['n']), 'mu': float(Results['mu']),\
+	'JC': float(Results['JC']), 'time': time()-t}
+	for name in ['stages','counts','peak_MB']:
+		Case_D[name] = Solver.Prof[name]
+	return Case_D
+
+
+def BenchTolerance(Params,tol):
+	""" tolerances of the compared results, looser for JC of the Pinned_L cases """
+	Tol_D = dict([[name,tol] for name in BenchResults_L])
+	if [Params['eps'],Params['P']] in Pinned_L: Tol_D['JC'] = max(tol,tolJC_pinned)
+	return Tol_D
+
+
+def BenchCompare(Case_D,Ref_D,Tol_D):
+	""" returns [max. deviation of results, time ratio, status string] """
+	if 'failed' in Case_D: return [None,None,'FAILED']
+	if Ref_D is None:      return [None,None,'no reference']
+	if 'failed' in Ref_D:  return [None,Case_D['time']/Ref_D['time'],'reference failed']
+	Dev_D = dict([[name,sp.fabs(Case_D[name]-Ref_D[name])] for name in BenchResults_L])
+	Ok = all([Dev_D[name] <= Tol_D[name] for name in BenchResults_L])
+	return [max(Dev_D.values()),Case_D['time']/Ref_D['time'],'ok' if Ok else 'DIFFERS']
+
+
+if __name__ == '__main__':
+	parser = ArgumentParser(description='benchmark of the 2ndPT solver')
+	parser.add_argument('--M',default='16:20',help='range of M as Mmin:Mmax or a single value')
+	parser.add_argument('--ref',default='squadbench.json',help='file with the reference values')
+	parser.add_argument('--store',action='store_true',help='store the results as reference values')
+	parser.add_argument('--tol',type=float,default=1e-4,help='tolerance of wABS, n, mu and JC')
+	parser.add_argument('--precision',default=Precision,help='storage precision, double or single')
+	parser.add_argument('-o',default='',help='file to write the results (JSON)')
+	args = parser.parse_args()
+	M_L = [int(m) for m in args.M.split(':')]
+	M_L = list(range(M_L[0],M_L[-1]+1))
+
+	if cfile not in listdir('.'):
+		print('- Parameter file '+cfile+' missing. Exit.')
+		exit(1)
+	Reference_D = {}
+	if path.isfile(args.ref):
+		with open(args.ref) as f: Reference_D = json.load(f)
+
+	Options = {'chat': False, 'Write_HFGF': 0, 'Write_Bubble': 0, 'Write_2ndSE': 0, 'Write_2ndGF': 0,\
+	'CacheDir': '', 'CheckpointDir': '', 'ProfFile': '', 'Precision': args.precision}
+	Bench_D = {}
+	NDiff = 0
+	print('# {0: <58s} {1: >8s} {2: >8s} {3: >10s} {4: >8s}  status'.format('case','time','ref','deviation','MB'))
+	for M in M_L:
+		Solver = None
+		for Params in BenchCases():
+			if Solver is None: Solver = SquadSolver(Params,EnergyGrid(M,dE),Options)
+			name = CaseName(M,Params)
+			Bench_D[name] = BenchCase(Solver,Params)
+			[Dev,Ratio,status] = BenchCompare(Bench_D[name],Reference_D.get(name),BenchTolerance(Params,args.tol))
+			if status in ['FAILED','DIFFERS']: NDiff += 1
+			print('  {0: <58s} {1: 8.2f} {2: >8s} {3: >10s} {4: 8.1f}  {5:s}'.format(name,Bench_D[name]['time'],\
+			'' if Ratio is None else '{0: .2f}x'.format(Ratio),'' if Dev is None else '{0: .2e}'.format(Dev),\
+			Bench_D[name].get('peak_MB') or 0.0,status))
+	if args.o != '':
+		with open(args.o,'w') as f: json.dump(Bench_D,f,indent = 1,sort_keys = True)
+	if args.store:
+		Reference_D.update(Bench_D)
+		with open(args.ref,'w') as f: json.dump(Reference_D,f,indent = 1,sort_keys = True)
+		print('# reference values written to '+args.ref)
+	print('# {0: 3d} of {1: 3d} cases failed or differ from reference'.format(NDiff,len(Bench_D)))
+	exit(1 if NDiff > 0 else 0)
+
+## squadbench.py end ##
+
@@ -0,0 +1,208 @@
+################################################################
+# SQUAD - superconducting quantum dot                          #
+# Copyright (C) 2012-2019  Vladislav Pokorny; pokornyv@fzu.cz  #
+# homepage: github.com/pokornyv/SQUAD                          #
+# squadboundary.py - locator of the 0-pi transition            #
+# method described in                                          #
+#    Sci. Rep. 5, 8821 (2015).                                 #
+#    Phys. Rev. B 93, 024523 (2016).                           #
+################################################################
+
+## usage: python squadboundary.py [--var P] [--range xmin:xmax] [--trace name:min:max:n]
+##        [--npred 21] [--xtol 1e-3] [--wmin w] [-o boundary.dat] <U> <Delta> <GammaR> <a> <eps> <P>
+## finds the point on the path var in [xmin,xmax] (other parameters fixed) where the 0-pi
+## transition happens, i.e., where the 2ndPT ABS energy reaches zero. Beyond this point
+## the ABS is pinned to the Fermi energy (below the resolution) and secondPT.py warns
+## about a false pi-phase. The transition is predicted from the cheap HF solution on
+## a grid of npred points, bracketed by full 2ndPT runs and refined by secant extrapolation
+## of the ABS energy on the 0-phase side, which is close to linear. Every run starts from
+## the solution of the nearest 0-phase point (continuation).
+## --trace: the boundary is located for every value of another parameter (e.g. U),
+## each search starts from the previous boundary shifted as the HF prediction
+## var and trace name are one of U, Delta, GammaR, a (= GammaL/GammaR), eps, P
+
+from squadsolver import *
+from argparse import ArgumentParser
+
+#############################
+##### List of functions: ####
+# MakeParams
+# FullEnergy
+# SecantZero
+# PredictHF
+# Locate
+
+PathVars_L = ['U','Delta','GammaR','a','eps','P']
+
+
+def MakeParams(Values_D):
+	""" PhysParams from the dictionary of path variables """
+	return PhysParams(Values_D['U'],Values_D['Delta'],Values_D['GammaR'],\
+	Values_D['a']*Values_D['GammaR'],Values_D['eps'],Values_D['P'])
+
+
+def FullEnergy(Solver,Params,Guess = None):
+	""" 2ndPT ABS energy, returns [wzero,Results], wzero is 0.0 if the solver fails,
+	    failures happen mostly on the pi side of the transition """
+	try:
+		Results = Solver.Run(Params,Guess)
+	except (RuntimeError,ValueError,SystemExit):
+		return [0.0,None]
+	return [float(sp.fabs(Results['wzero'])),Results]
+
+
+def SecantZero(Pts_L):
+	""" zero of the line through the last two 0-phase points [x,w] """
+	[[x1,w1],[x2,w2]] = Pts_L[-2:]
+	if w1 == w2: return None
+	return x2-w2*(x2-x1)/(w2-w1)
+
+
+def PredictHF(Solver,Values_D,var,X_A,wmin):
+	""" HF ABS energies on the grid X_A, returns [x_HF,W_A], x_HF is the
+	    predicted transition or None if the HF energy does not reach zero
+	    all points are solved at once by SolveHFBatch, failed points have W = 0 """
+	Params_L = []
+	for x in X_A:
+		Values_D[var] = x
+		Params_L.append(MakeParams(Values_D))
+	[n_A,mu_A,W_A,ErrMsg_A,Res_A] = Solver.SolveHFBatch(Params_L)
+	W_A = sp.where(ErrMsg_A == 0,W_A,0.0)
+	Zero_A = sp.nonzero((W_A[:-1] > wmin) != (W_A[1:] > wmin))[0]
+	if len(Zero_A) == 0: return [None,W_A]
+	i = Zero_A[0]
+	## extrapolate from the 0-phase side
+	Pts_L = [[X_A[j],W_A[j]] for j in ([i-1,i] if W_A[i] > wmin else [i+2,i+1]) if 0 <= j < len(X_A)]
+	x_HF = SecantZero(Pts_L) if len(Pts_L) == 2 else None
+	if x_HF is None or not min(X_A[i],X_A[i+1]) <= x_HF <= max(X_A[i],X_A[i+1]):
+		x_HF = (X_A[i]+X_A[i+1])/2.0
+	return [x_HF,W_A]
+
+
+def Locate(Solver,Values_D,var,xmin,xmax,npred,xtol,wmin,Prev_D = None):
+	""" locates the transition on the path, returns a dictionary with the boundary
+	    x_c, the final bracket [a,b], HF prediction x_HF and the number of full runs
+	    Prev_D is the result of Locate at a nearby path (tracing) """
+	X_A = sp.linspace(xmin,xmax,npred)
+	[x_HF,W_A] = PredictHF(Solver,Values_D,var,X_A,wmin)
+	## start from the previous boundary shifted by the change of the HF prediction
+	x0 = None
+	if Prev_D is not None and None not in [Prev_D['x_c'],Prev_D['x_HF'],x_HF]:
+		x0 = Prev_D['x_c']+x_HF-Prev_D['x_HF']
+	Found_D = {'x_HF': x_HF, 'x_c': None, 'a': None, 'b': None, 'runs': 0, 'w_a': None}
+	Pts_L = []	## 0-phase points [x,w], a is the last one
+	[Pinned,Guess] = [None,None]
+	def Full(x):
+		Values_D[var] = x
+		[w,Results] = FullEnergy(Solver,MakeParams(Values_D),Guess)
+		Found_D['runs'] += 1
+		return [w,Results]
+	## orientation of the path: 0-phase at the end with larger HF energy
+	[x_zero,x_pi] = [xmin,xmax] if W_A[0] >= W_A[-1] else [xmax,xmin]
+	step = (x_pi-x_zero)/(npred-1.0)
+	x = x0 if x0 is not None else (x_HF if x_HF is not None else x_zero)
+	x = min(max(x,min(xmin,xmax)),max(xmin,xmax))
+	## bracketing, steps double until the phase changes
+	while True:
+		[w,Results] = Full(x)
+		if w > wmin:
+			Pts_L.append([x,w])
+			Guess = Results
+			if Pinned is not None: break
+			x_new = SecantZero(Pts_L) if len(Pts_L) > 1 else x+step
+			if x_new is None or (x_new-x)*step <= 0.0: x_new = x+step
+			step *= 2.0
+		else:
+			Pinned = x
+			if len(Pts_L) > 0: break
+			x_new = x-step
+			step *= 2.0
+		if (x_new-x_zero)*(x_new-x_pi) > 0.0:	## out of the range
+			x_new = x_pi if w > wmin else x_zero
+			if x_new == x: return Found_D
+		x = x_new
+	## refining the bracket [a,b], a on the 0-phase side, b pinned
+	## the next point is placed xtol/2 behind the extrapolated zero on the side
+	## opposite to the last point, so that the bracket closes in few steps
+	[a,b] = [Pts_L[-1][0],Pinned]
+	while sp.fabs(b-a) > xtol and Found_D['runs'] < 30:
+		x = SecantZero(Pts_L) if len(Pts_L) > 1 else None
+		if x is not None: x += 0.5*xtol*sp.sign(b-a)*(1.0 if w > wmin else -1.0)
+		## safeguard: the secant step must stay inside the bracket
+		if x is None or not 0.0 < (x-a)/(b-a) < 1.0: x = (a+b)/2.0
+		[w,Results] = Full(x)
+		if w > wmin:
+			Pts_L.append([x,w])
+			Guess = Results
+			a = x
+		else:
+			b = x
+	x_c = SecantZero(Pts_L) if len(Pts_L) > 1 else None
+	if x_c is None or not min(a,b) <= x_c <= max(a,b): x_c = (a+b)/2.0
+	Found_D.update({'x_c': x_c, 'a': a, 'b': b, 'w_a': Pts_L[-1][1]})
+	return Found_D
+
+
+if __name__ == '__main__':
+	t = time()
+	parser = ArgumentParser(description='locator of the 0-pi transition in the 2ndPT solution')
+	parser.add_argument('--var',default='P',choices=PathVars_L,help='parameter varied along the path')
+	parser.add_argument('--range',default='0:0.999',help='range of the path as xmin:xmax')
+	parser.add_argument('--trace',default='',help='second parameter as name:min:max:n, traces the boundary')
+	parser.add_argument('--npred',type=int,default=21,help='number of HF points on the path')
+	parser.add_argument('--xtol',type=float,default=1e-3,help='tolerance of the boundary position')
+	parser.add_argument('--wmin',type=float,default=None,help='ABS energies below wmin are pinned (default 10*dE)')
+	parser.add_argument('-o',default='boundary.dat',help='output file')
+	parser.add_argument('pars',type=float,nargs=6,help='U Delta GammaR a eps P')
+	args = parser.parse_args()
+
+	if cfile not in listdir('.'):
+		print('- Parameter file '+cfile+' missing. Exit.')
+		exit(1)
+	Values_D = dict(zip(PathVars_L,args.pars))
+	[xmin,xmax] = [float(x) for x in args.range.split(':')]
+	Trace_L = [None]
+	if args.trace != '':
+		[tname,tmin,tmax,nt] = args.trace.split(':')
+		if tname not in PathVars_L or tname == args.var:
+			print('- Wrong --trace parameter '+tname+'. Exit.')
+			exit(1)
+		Trace_L = sp.linspace(float(tmin),float(tmax),int(nt))
+	wmin = 10.0*dE if args.wmin is None else args.wmin
+
+	Options = {'chat': False, 'Write_HFGF': 0, 'Write_Bubble': 0, 'Write_2ndSE': 0, 'Write_2ndGF': 0}
+	try:
+		Solver = SquadSolver(MakeParams(Values_D),EnergyGrid(M,dE),Options)
+	except ValueError as err:
+		print(err)
+		exit(1)
+
+	f = open(args.o,'w')
+	header = '# {0:s}\tx_c\ta\tb\tw(a)\tx_HF\truns'.format(args.trace.split(':')[0] if args.trace != '' else '-')
+	f.write(header+'\n')
+	if chat: print('# squadboundary: path in '+args.var+' from {0: .5f} to {1: .5f}'.format(xmin,xmax))
+	if chat: print(header)
+	Prev_D = None
+	for tval in Trace_L:
+		if tval is not None: Values_D[tname] = tval
+		try:
+			Found_D = Locate(Solver,Values_D,args.var,xmin,xmax,args.npred,args.xtol,wmin,Prev_D)
+		except ValueError as err:
+			Found_D = {'x_c': None, 'x_HF': None, 'runs': 0}
+			print('# - Error: '+str(err))
+		tstr = '-' if tval is None else '{0: .5f}'.format(tval)
+		if Found_D['x_c'] is None:
+			line = '# {0:s}: no transition found, {1: 3d} full runs'.format(tstr,Found_D['runs'])
+		else:
+			line = '{0:s}\t{1: .5f}\t{2: .5f}\t{3: .5f}\t{4: .5f}\t{5:s}\t{6: 3d}'.format(tstr,Found_D['x_c']\
+			,Found_D['a'],Found_D['b'],Found_D['w_a'],'-' if Found_D['x_HF'] is None else '{0: .5f}'\
+			.format(Found_D['x_HF']),Found_D['runs'])
+		f.write(line+'\n')
+		f.flush()
+		print(line)
+		Prev_D = Found_D
+	f.close()
+	if chat: print('# '+argv[0]+' DONE after {0: .2f} seconds.'.format(time()-t))
+
+## squadboundary.py end ##
+
@@ -0,0 +1,169 @@
+################################################################
+# SQUAD - superconducting quantum dot                          #
+# Copyright (C) 2012-2019  Vladislav Pokorny; pokornyv@fzu.cz  #
+# homepage: github.com/pokornyv/SQUAD                          #
+# squadcache.py - on-disk cache and checkpoints of 2ndPT       #
+# method described in                                          #
+#    Sci. Rep. 5, 8821 (2015).                                 #
+#    Phys. Rev. B 93, 024523 (2016).                           #
+################################################################
+
+from config_squad import *
+from os import path,makedirs,remove,rename,utime,getpid
+from hashlib import sha1
+
+#############################
+##### List of functions: ####
+# CacheKey
+# CacheName
+# CacheNearest
+# CacheRead
+# CacheWrite
+# CacheEvict
+# CheckpointKey
+# StaticOptions
+# CheckpointWrite
+# CheckpointRead
+
+## Results are stored in CacheDir as <group>_<eps>_<P>_<hash>.npz, the hash is calculated
+## from the physical parameters and the options that change the numbers, the group hash
+## from the same without eps and P. If CacheSeed is positive, a new point starts from
+## the nearest cached point of its group within the distance CacheSeed in (eps,P),
+## the point is found from the file names (CacheNearest).
+## Files are evicted by last access time when CacheDir exceeds CacheSize MB.
+
+## physical parameters and options that enter the hash
+CacheParams_L  = ['U','Delta','GammaR','GammaL','eps','P']
+CacheOptions_L = ['M','dE','ConvN','ConvX','ConvHF','rootf','MuMin','MuMax','HFmethod','HFgrid','HFpoints','Precision',\
+'KKpoles','PHsymmetry']
+CacheGroup_L   = ['U','Delta','GammaR','GammaL']
+
+## scalar results and small arrays that are stored
+CacheResults_L = ['nHF','muHF','wzeroHF','ResGaHF','IDin','ErrMsgHF','wzero','n','mu','n_final','mu_final'\
+,'IDout','Res_A','ABS_A','ABSpos_A','SEnABS','SEaABS','JCband','JCgap','JC']
+
+#####################################################################
+# cache access ######################################################
+
+def CacheKey(Globals,Names_L = CacheParams_L+CacheOptions_L):
+	""" hash of the parameters and options, Globals is the dictionary SquadSolver.Globals """
+	Key_L = [(name,repr(Globals[name])) for name in Names_L]
+	return sha1(repr(Key_L).encode('utf-8')).hexdigest()
+
+
+def CacheName(Globals):
+	""" name of the cache file without extension, <group hash>_<eps>_<P>_<hash> """
+	return '{0:s}_{1:.12e}_{2:.12e}_{3:s}'.format(CacheKey(Globals,CacheGroup_L+CacheOptions_L)[:12],\
+	Globals['eps'],Globals['P'],CacheKey(Globals))
+
+
+def CacheNearest(Globals):
+	""" results of the cached point of the same group (same U, Delta, GammaR, GammaL and options)
+	    that is nearest in eps and P within the distance CacheSeed, None if there is none
+	    or CacheSeed is not positive. Used as Guess of a new point, the points whose HF
+	    solution failed or whose HF or 2ndPT ABS is within dE of zero are skipped """
+	if CacheSeed <= 0.0 or not path.isdir(CacheDir): return None
+	group = CacheKey(Globals,CacheGroup_L+CacheOptions_L)[:12]
+	Near_L = []
+	for fn in listdir(CacheDir):
+		Name_L = fn[:-4].split('_')
+		if not (fn.endswith('.npz') and len(Name_L) == 4 and Name_L[0] == group): continue
+		d = sp.hypot(float(Name_L[1])-Globals['eps'],float(Name_L[2])-Globals['P'])
+		if d <= CacheSeed: Near_L.append([d,fn[:-4]])
+	for [d,key] in sorted(Near_L):
+		Results = CacheRead(key)
+		if Results is None or Results['ErrMsgHF'] != 0: continue
+		if min(sp.fabs(Results['wzeroHF']),sp.fabs(Results['wzero'])) >= dE: return Results
+	return None
+
+
+def CacheRead(key):
+	""" returns the cached results dictionary or None if not in cache """
+	fname = path.join(CacheDir,key+'.npz')
+	if not path.isfile(fname): return None
+	try:
+		Data = sp.load(fname)
+		Results = dict([(name,Data[name][()]) for name in Data.files])
+		Data.close()
+	except (IOError,ValueError,KeyError):
+		return None
+	utime(fname,None)	## last access time for LRU eviction
+	return Results
+
+
+def CacheWrite(key,Results):
+	""" stores the results, Sigman_A and Sigmaa_A only if CacheArrays is set """
+	if not path.isdir(CacheDir): makedirs(CacheDir)
+	Store_L = CacheResults_L+(['Sigman_A','Sigmaa_A'] if CacheArrays else [])
+	## written to a temporary file first, processes of a sweep can share the cache
+	ftmp = path.join(CacheDir,key+'.'+str(getpid())+'.tmp')
+	f = open(ftmp,'wb')
+	sp.savez_compressed(f,**dict([(name,Results[name]) for name in Store_L]))
+	f.close()
+	rename(ftmp,path.join(CacheDir,key+'.npz'))
+	CacheEvict()
+
+
+def CacheEvict():
+	""" removes least recently used files until the cache is smaller than CacheSize MB """
+	Files_L = [path.join(CacheDir,fn) for fn in listdir(CacheDir) if fn.endswith('.npz')]
+	Stat_L = []
+	for fname in Files_L:
+		try: Stat_L.append([path.getmtime(fname),path.getsize(fname),fname])
+		except OSError: pass	## removed by another process
+	Stat_L.sort()
+	Size = sum([st[1] for st in Stat_L])
+	while Size > CacheSize*1024**2 and len(Stat_L) > 1:
+		[mtime,size,fname] = Stat_L.pop(0)
+		try: remove(fname)
+		except OSError: pass
+		Size -= size
+
+#####################################################################
+# checkpoints of the stages of a single run #########################
+
+## Every stage of SquadSolver.Run is written to CheckpointDir/<hash>/ as
+## <stage>_<name>.npy files for arrays and <stage>.npz for scalars, the latter
+## is written last and marks the stage as finished. Arrays are read memory-mapped.
+## The hash does not contain the root-finding options of the static self-energy,
+## the static stage stores them and is recalculated if they change.
+
+CheckpointOptions_L = ['M','dE','ConvHF','HFmethod','HFgrid','HFpoints','Precision','KKpoles','PHsymmetry']
+StaticOptions_L     = ['rootf','ConvN','ConvX','MuMin','MuMax']
+
+def CheckpointKey(Globals):
+	""" hash of the parameters and options that define the stages up to the dynamic self-energy """
+	return CacheKey(Globals,CacheParams_L+CheckpointOptions_L)
+
+
+def StaticOptions(Globals):
+	""" string of options used in the static self-energy stage """
+	return repr([(name,Globals[name]) for name in StaticOptions_L])
+
+
+def CheckpointWrite(key,stage,Stage_D):
+	""" writes the dictionary Stage_D returned by a stage, arrays are the entries ending with _A """
+	cdir = path.join(CheckpointDir,key)
+	if not path.isdir(cdir): makedirs(cdir)
+	for name in Stage_D:
+		if name.endswith('_A'): sp.save(path.join(cdir,stage+'_'+name+'.npy'),Stage_D[name])
+	f = open(path.join(cdir,stage+'.tmp'),'wb')
+	sp.savez(f,**dict([(name,Stage_D[name]) for name in Stage_D if not name.endswith('_A')]))
+	f.close()
+	rename(path.join(cdir,stage+'.tmp'),path.join(cdir,stage+'.npz'))
+
+
+def CheckpointRead(key,stage):
+	""" returns the dictionary of a finished stage or None """
+	cdir = path.join(CheckpointDir,key)
+	if not path.isfile(path.join(cdir,stage+'.npz')): return None
+	Data = sp.load(path.join(cdir,stage+'.npz'))
+	Stage_D = dict([(name,Data[name][()]) for name in Data.files])
+	Data.close()
+	for fn in listdir(cdir):
+		if fn.startswith(stage+'_') and fn.endswith('_A.npy'):
+			Stage_D[fn[len(stage)+1:-4]] = sp.load(path.join(cdir,fn),mmap_mode = 'r')
+	return Stage_D
+
+## squadcache.py end ##
+
@@ -0,0 +1,134 @@
+################################################################
+# SQUAD - superconducting quantum dot                          #
+# Copyright (C) 2012-2019  Vladislav Pokorny; pokornyv@fzu.cz  #
+# homepage: github.com/pokornyv/SQUAD                          #
+# squadfft.py - FFT backends                                   #
+# method described in                                          #
+#    Sci. Rep. 5, 8821 (2015).                                 #
+#    Phys. Rev. B 93, 024523 (2016).                           #
+################################################################
+
+from config_squad import *
+from numpy import fft as numpy_fft
+from scipy import fftpack
+from os import path
+from multiprocessing import cpu_count
+import pickle
+
+## optional backends
+try:
+	import scipy.fft as scipy_fft	## scipy >= 1.4
+except ImportError:
+	scipy_fft = None
+try:
+	import pyfftw
+	import pyfftw.interfaces.numpy_fft as pyfftw_fft
+	pyfftw.interfaces.cache.enable()
+except ImportError:
+	pyfftw = None
+
+#############################
+##### List of functions: ####
+# FFTBackends
+# MakeBackend
+# LoadWisdom
+# SaveWisdom
+# BenchmarkFFT
+# Backend
+# FFTr
+# IFFTr
+
+## selected backends, keys are (FFTbackend,FFTworkers,length of the array)
+Backend_D = {}
+
+#####################################################################
+# backends ##########################################################
+
+def FFTBackends():
+	""" list of backends available in this installation """
+	Backends_L = ['numpy']
+	if scipy_fft is not None: Backends_L.append('scipy')
+	if pyfftw is not None:    Backends_L.append('pyfftw')
+	Backends_L.append('fftpack')
+	return Backends_L
+
+
+def MakeBackend(name,workers):
+	""" returns a pair of functions [rfft(X_A), irfft(ftX_A,L)] for given backend
+	    workers is the number of threads, -1 means all cores (scipy and pyfftw only)
+	    all transforms run along the last axis, 2D arrays are transformed row by row """
+	if name == 'numpy':
+		return [numpy_fft.rfft, lambda ftX_A,L: numpy_fft.irfft(ftX_A,L)]
+	elif name == 'scipy':
+		return [lambda X_A: scipy_fft.rfft(X_A,workers=workers),\
+		        lambda ftX_A,L: scipy_fft.irfft(ftX_A,L,workers=workers)]
+	elif name == 'pyfftw':
+		threads = cpu_count() if workers < 0 else workers
+		return [lambda X_A: pyfftw_fft.rfft(X_A,threads=threads,planner_effort='FFTW_MEASURE'),\
+		        lambda ftX_A,L: pyfftw_fft.irfft(ftX_A,L,threads=threads,planner_effort='FFTW_MEASURE')]
+	else: ## 'fftpack', complex transforms of the old code
+		return [lambda X_A: fftpack.fft(X_A)[...,:int(X_A.shape[-1]/2)+1],\
+		        lambda ftX_A,L: sp.real(fftpack.ifft(sp.concatenate([ftX_A,sp.conj(ftX_A[...,-2:0:-1])],axis = -1)))]
+
+
+def LoadWisdom():
+	""" reads the pyFFTW wisdom from WisdomFile """
+	if pyfftw is not None and WisdomFile != '' and path.isfile(WisdomFile):
+		with open(WisdomFile,'rb') as f:
+			pyfftw.import_wisdom(pickle.load(f))
+
+
+def SaveWisdom():
+	""" writes the pyFFTW wisdom to WisdomFile """
+	if pyfftw is not None and WisdomFile != '':
+		with open(WisdomFile,'wb') as f:
+			pickle.dump(pyfftw.export_wisdom(),f)
+
+
+def BenchmarkFFT(L,Backends_L,workers):
+	""" times forward and backward transform of length L for all backends in Backends_L
+	    returns the name of the fastest one """
+	X_A = sp.random.rand(L)
+	Time_L = []
+	for name in Backends_L:
+		[rfft,irfft] = MakeBackend(name,workers)
+		irfft(rfft(X_A),L)	## warm-up, planning for pyFFTW
+		t = time()
+		for i in range(3): irfft(rfft(X_A),L)
+		Time_L.append((time()-t)/3.0)
+		if chat: print('# - BenchmarkFFT: {0: <8s} {1: .5f} s'.format(name,Time_L[-1]))
+	return Backends_L[int(sp.argmin(Time_L))]
+
+
+def Backend(L):
+	""" selects the backend for arrays of length L according to FFTbackend and FFTworkers """
+	key = (FFTbackend,FFTworkers,L)
+	if key not in Backend_D:
+		Backends_L = FFTBackends()
+		if 'pyfftw' in Backends_L: LoadWisdom()
+		if FFTbackend == 'auto':
+			name = BenchmarkFFT(L,Backends_L,FFTworkers)
+		elif FFTbackend in Backends_L:
+			name = FFTbackend
+		else:
+			print('# - Warning: Backend: FFT backend '+str(FFTbackend)+' not available, using fftpack.')
+			name = 'fftpack'
+		if chat and FFTbackend == 'auto': print('# - using '+name+' FFT backend')
+		Backend_D[key] = MakeBackend(name,FFTworkers)
+		if name == 'pyfftw':
+			Backend_D[key][1](Backend_D[key][0](sp.zeros(L)),L)	## plan both directions
+			SaveWisdom()
+	return Backend_D[key]
+
+
+def FFTr(X_A):
+	""" Fourier transform of a real array along the last axis """
+	return Backend(X_A.shape[-1])[0](X_A)
+
+
+def IFFTr(ftX_A,L):
+	""" inverse of FFTr, returns real array with L points along the last axis """
+	return Backend(L)[1](ftX_A,L)
+
+## squadfft.py end ##
+
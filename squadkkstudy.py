@@ -0,0 +1,96 @@
+################################################################
+# SQUAD - superconducting quantum dot                          #
+# Copyright (C) 2012-2019  Vladislav Pokorny; pokornyv@fzu.cz  #
+# homepage: github.com/pokornyv/SQUAD                          #
+# squadkkstudy.py - accuracy of the Kramers-Kronig transforms  #
+# method described in                                          #
+#    Sci. Rep. 5, 8821 (2015).                                 #
+#    Phys. Rev. B 93, 024523 (2016).                           #
+################################################################
+
+## usage: python squadkkstudy.py [--Mref 21] [--dEref 1e-4] [--grids 13:16@1e-3,16:19@1e-4] [-o file]
+## compares the plain Kramers-Kronig transform (KKpoles = 0) with the pole-subtracted one
+## (KKpoles = 1) on coarse grids. The reference is calculated with KKpoles = 1 on the grid
+## (Mref,dEref), the max. deviation of wABS, n, mu and JC from it is printed for every grid
+## in --grids, given as Mmin:Mmax@dE ranges. dE should be a power of ten, otherwise
+## the band edges are rounded to a neighbouring point (see BandEdges)
+## the physical parameters are the squadbench.py cases with P = 0.5
+
+from squadsolver import *
+from squadbench import Couplings_L,Levels_L,Delta_bench,BenchResults_L,CaseName
+from argparse import ArgumentParser
+import json
+
+#############################
+##### List of functions: ####
+# StudyCases
+# StudyGrids
+# StudyRun
+
+Phase_study = 0.5
+
+
+def StudyCases():
+	""" physical parameters of the study, the benchmark couplings at a single phase """
+	return [PhysParams(U,Delta_bench,GammaR,a*GammaR,eps,Phase_study)\
+	for [U,GammaR,a] in Couplings_L for eps in Levels_L]
+
+
+def StudyGrids(s):
+	""" list of [M,dE] of the coarse grids from the string Mmin:Mmax@dE,... """
+	Grids_L = []
+	for Range in s.split(','):
+		[Ms,de] = Range.split('@')
+		M_L = [int(m) for m in Ms.split(':')]
+		Grids_L += [[m,float(de)] for m in range(M_L[0],M_L[-1]+1)]
+	return Grids_L
+
+
+def StudyRun(Params,M,dE,KKpoles,Options):
+	""" wABS, n, mu and JC for a single grid, None if the solver fails """
+	Options = dict(Options)
+	Options['KKpoles'] = KKpoles
+	try:
+		Solver = SquadSolver(Params,EnergyGrid(M,dE),Options)
+		Results = Solver.Run()
+	except (RuntimeError,ValueError,SystemExit):
+		return None
+	return {'wABS': float(Results['wzero']), 'n': float(Results['n']),\
+	'mu': float(Results['mu']), 'JC': float(Results['JC'])}
+
+
+if __name__ == '__main__':
+	parser = ArgumentParser(description='accuracy of the pole-subtracted Kramers-Kronig transform')
+	parser.add_argument('--Mref',type=int,default=21,help='M of the reference grid')
+	parser.add_argument('--dEref',type=float,default=1e-4,help='dE of the reference grid')
+	parser.add_argument('--grids',default='13:16@1e-3,16:19@1e-4',help='coarse grids as Mmin:Mmax@dE,...')
+	parser.add_argument('-o',default='',help='file to write the results (JSON)')
+	args = parser.parse_args()
+	Grids_L = StudyGrids(args.grids)
+
+	if cfile not in listdir('.'):
+		print('- Parameter file '+cfile+' missing. Exit.')
+		exit(1)
+	Options = {'chat': False, 'Write_HFGF': 0, 'Write_Bubble': 0, 'Write_2ndSE': 0, 'Write_2ndGF': 0,\
+	'CacheDir': '', 'CheckpointDir': '', 'ProfFile': ''}
+	Study_D = {}
+	print('# {0: <52s} {1: >3s} {2: >9s} {3: >10s} {4: >10s}'.format('case','M','dE','KKpoles=0','KKpoles=1'))
+	for Params in StudyCases():
+		Ref_D = StudyRun(Params,args.Mref,args.dEref,1,Options)
+		name = CaseName(args.Mref,Params)
+		Study_D[name] = {'reference': Ref_D}
+		if Ref_D is None:
+			print('# {0: <52s} reference failed'.format(name))
+			continue
+		for [m,de] in Grids_L:
+			Dev_L = []
+			for KKpoles in [0,1]:
+				R_D = StudyRun(Params,m,de,KKpoles,Options)
+				Dev_L.append(None if R_D is None else max([sp.fabs(R_D[x]-Ref_D[x]) for x in BenchResults_L]))
+				Study_D[name]['M={0:d} dE={1:.0e} KKpoles={2:d}'.format(m,de,KKpoles)] = R_D
+			print('  {0: <52s} {1: 3d} {2: 9.0e} {3: >10s} {4: >10s}'.format(name.split(' ',1)[1],m,de,\
+			*['failed' if d is None else '{0: .2e}'.format(d) for d in Dev_L]))
+	if args.o != '':
+		with open(args.o,'w') as f: json.dump(Study_D,f,indent = 1,sort_keys = True)
+
+## squadkkstudy.py end ##
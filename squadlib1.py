@@ -10,34 +10,54 @@
 
 from config_squad import *
 from scipy.integrate import trapz,simps
-from scipy.optimize import fixed_point,brentq
+from scipy.optimize import fixed_point,brentq,root
+from squadprof import Counted,ProfCount
 
 #############################
 ##### List of functions: ####
+# StorageTypes
 # KondoTemperature
 # FindInEnergies
+# HybPhase
 # SFunctionBand
 # SFunctionGap
 # DeltaFunctionBand
 # DeltaFunctionGap
 # SFunctionGapDiff
 # DeltaFunctionGapDiff
+# HybTable
+# GapNewton
 # AndreevEnergy
 # DetBand
 # DetGap
 # DetDiff
-# GFnBand
-# GFnGap
-# GFaBand
-# GFaGap
 # GFresidues
+# HFABSpos
 # FillGreenHF
+# HFGrid
 # MSumsHF
+# SolveHFroot
 # SolveHF
+# BatchParams
+# BatchSelect
+# BatchGapHyb
+# BatchDetDiff
+# AndreevMap
+# BatchAndreevEnergy
+# BatchMSumsHF
+# BatchResidues
+# SolveHFBatch
 
 #####################################################################
 # general functions #################################################
 
+def StorageTypes():
+	""" real and complex types of the stored Green functions and self-energies,
+	    Precision = single halves the memory at the cost of ~1e-7 relative accuracy """
+	if Precision == 'single': return ['float32','complex64']
+	return ['float64','complex128']
+
+
 def KondoTemperature():
 	""" Kondo temperature from Bethe ansatz for single impurity Anderson model """
 	if U == 0.0 or GammaTot == 0.0:
@@ -58,6 +78,21 @@ def FindInEnergies(x,X_A):
 #####################################################################
 # dot-lead hybridizations ###########################################
 
+## phase factors of the anomalous hybridization, key is (GammaL,GammaR,Phi)
+HybPhase_D = {}
+
+def HybPhase():
+	""" phase factors of the anomalous hybridization, calculated once per parameter set
+	    returns [exp(i PhiC), GammaL exp(-i Phi/2) + GammaR exp(i Phi/2)]
+	    PhiC angle helps to keep hybridization real or pure imaginary, not complex """
+	key = (GammaL,GammaR,Phi)
+	if key not in HybPhase_D:
+		HybPhase_D.clear()
+		PhiC = sp.arctan((GammaL-GammaR)/(GammaL+GammaR+1e-12)*sp.tan(Phi/2.0))
+		HybPhase_D[key] = [sp.exp(1.0j*PhiC),GammaL*sp.exp(-1.0j*Phi/2.0) + GammaR*sp.exp(1.0j*Phi/2.0)]
+	return HybPhase_D[key]
+
+
 def SFunctionBand(x):
 	""" normal hybridization in band region (imaginary) """
 	return 1.0j*sp.sign(x)*(GammaL+GammaR)/sp.sqrt(x**2-Delta**2)
@@ -69,18 +104,15 @@ def SFunctionGap(x):
 
 
 def DeltaFunctionBand(x):
-	""" anomalous hybridization in band region (imaginary)
-	    PhiC angle helps to keep hybridization real or pure imaginary, not complex """
-	PhiC = sp.arctan((GammaL-GammaR)/(GammaL+GammaR+1e-12)*sp.tan(Phi/2.0))
-	return 1.0j*sp.sign(x)*Delta*sp.exp(1.0j*PhiC)/sp.sqrt(x**2-Delta**2)\
-	*(GammaL*sp.exp(-1.0j*Phi/2.0) + GammaR*sp.exp(1.0j*Phi/2.0))
+	""" anomalous hybridization in band region (imaginary) """
+	[ExpPhiC,PhaseSum] = HybPhase()
+	return 1.0j*sp.sign(x)*Delta*ExpPhiC/sp.sqrt(x**2-Delta**2)*PhaseSum
 
 
 def DeltaFunctionGap(x):
 	""" anomalous hybridization in gap region (real) """
-	PhiC = sp.arctan((GammaL-GammaR)/(GammaL+GammaR+1e-12)*sp.tan(Phi/2.0))
-	return Delta*sp.exp(1.0j*PhiC)/sp.sqrt(Delta**2-x**2)\
-	*(GammaL*sp.exp(-1.0j*Phi/2.0) + GammaR*sp.exp(1.0j*Phi/2.0))
+	[ExpPhiC,PhaseSum] = HybPhase()
+	return Delta*ExpPhiC/sp.sqrt(Delta**2-x**2)*PhaseSum
 
 
 def SFunctionGapDiff(x):
@@ -90,9 +122,8 @@ def SFunctionGapDiff(x):
 
 def DeltaFunctionGapDiff(x):
 	""" energy derivative of Delta(w) """
-	PhiC = sp.arctan((GammaL-GammaR)/(GammaL+GammaR+1e-12)*sp.tan(Phi/2.0))	
-	return x*Delta*sp.exp(1.0j*PhiC)/(Delta**2-x**2)**(3.0/2.0)\
-	*(GammaL*sp.exp(-1.0j*Phi/2.0) + GammaR*sp.exp(1.0j*Phi/2.0))
+	[ExpPhiC,PhaseSum] = HybPhase()
+	return x*Delta*ExpPhiC/(Delta**2-x**2)**(3.0/2.0)*PhaseSum
 
 
 ## hybridizations as lambda functions
@@ -103,64 +134,111 @@ DFg = lambda x: DeltaFunctionGap(x)
 SFD = lambda x: SFunctionGapDiff(x)
 DFD = lambda x: DeltaFunctionGapDiff(x)
 
+## tabulated hybridizations, one entry [key,X_A,S_A,D_A] for the energy axis ('En')
+## and one for the band grid of MSumsHF ('HF'), X_A is kept so that its id is not reused
+HybTable_D = {}
+
+def HybTable(X_A = None):
+	""" S and Delta hybridizations tabulated once per parameter set, returns [S_A,D_A]
+	    X_A = None: on the energy axis En_A, band and gap regions, zero at the gap edges
+	    otherwise on the band grid X_A (below -Delta) used in MSumsHF """
+	if X_A is None: key = ('En',N,dE,Delta,GammaL,GammaR,Phi)
+	else:           key = ('HF',id(X_A),len(X_A),Delta,GammaL,GammaR,Phi)
+	if key[0] not in HybTable_D or HybTable_D[key[0]][0] != key:
+		if X_A is None:
+			[S_A,D_A] = [sp.zeros(N,dtype = complex) for i in range(2)]
+			for I in [slice(0,EdgePos1),slice(EdgePos2+1,N)]:
+				[S_A[I],D_A[I]] = [SFb(En_A[I]),DFb(En_A[I])]
+			I = slice(EdgePos1+1,EdgePos2)
+			[S_A[I],D_A[I]] = [SFg(En_A[I]),DFg(En_A[I])]
+		else:
+			[S_A,D_A] = [SFb(X_A),DFb(X_A)]
+		HybTable_D[key[0]] = [key,X_A,S_A,D_A]
+	return HybTable_D[key[0]][2:]
+
 #####################################################################
 # Andreev bound states frequencies ##################################
 
-def AndreevEnergy(hfe,mu):
-	""" returns the ABS frequency in the Hartree-Fock approximation """
-	eqn = lambda x: sp.sqrt(hfe**2+(DFg(x)-U*mu)**2)/(1.0+SFg(x))
-	## change the initial condition init_val if convercence problems raise
-	wzero = sp.real_if_close(fixed_point(eqn,ABSinit_val*Delta))
-	if sp.fabs(sp.imag(wzero)) > 1e-12:
-		print("# - Warning: AndreevEnergy: Non-zero Im w(ABS) = {0: .5e}".format(sp.imag(wzero)))
-	return sp.float64(sp.real(wzero))	## caution: fixed_point returns numpy.ndarray
+def GapNewton(hfe,Umu,Hyb,winit,Delta_A,xtol = 1e-12,maxiter = 100):
+	""" zeros of the HF determinant (DetGap) in the gap (0,Delta) by the Newton method safeguarded
+	    by bisection, vectorized over arrays of points hfe and Umu = U*mu, the derivative is DetDiff
+	    Hyb(x) returns real [S,Delta,dS/dx,dDelta/dx] for an array x of energies, one per point
+	    winit is an array of initial values, the midpoint of the gap is used if it is outside (0,Delta)
+	    returns [wzero_A,Ok_A], Ok_A is False if Det does not change sign in (0,Delta) or no convergence """
+	def G(x):
+		""" Det has a pole at the gap edge where Newton steps are tiny, we iterate
+		    (Delta^2-x^2)*Det that has the same zeros and is finite at the edge, returns [G,dG/dx] """
+		[S_A,D_A,dS_A,dD_A] = Hyb(x)
+		Det_A  = x**2*(1.0+S_A)**2-hfe**2-(D_A-Umu)**2
+		DDet_A = 2.0*x*(1.0+S_A)**2+2.0*x**2*(1.0+S_A)*dS_A-2.0*dD_A*(D_A-Umu)
+		return [(Delta_A**2-x**2)*Det_A,(Delta_A**2-x**2)*DDet_A-2.0*x*Det_A]
+	a = sp.zeros(len(winit))	## Det(0) <= 0
+	b = Delta_A-offset_x
+	Ok_A = G(b)[0] > 0.0
+	x = sp.where((winit > 0.0) & (winit < b),winit,0.5*b)
+	Act_A = Ok_A.copy()
+	for k in range(maxiter):
+		if not any(Act_A): break
+		[G_A,DG_A] = G(x)
+		a = sp.where(G_A < 0.0,x,a)
+		b = sp.where(G_A > 0.0,x,b)
+		xn = sp.where(G_A == 0.0,x,x-G_A/DG_A)
+		## bisection if the Newton step leaves the bracket
+		xn = sp.where((xn >= a) & (xn <= b),xn,0.5*(a+b))
+		xn = sp.where(Act_A,xn,x)
+		Act_A = Act_A & (sp.fabs(xn-x) > xtol*Delta_A)
+		x = xn
+	return [x,Ok_A & ~Act_A]
+
+
+@Counted
+def AndreevEnergy(hfe,mu,winit = None):
+	""" returns the ABS frequency in the Hartree-Fock approximation, the zero of DetGap in (0,Delta),
+	    hfe and mu can be arrays, winit is the initial value, ABSinit_val*Delta if not given
+	    solved by GapNewton, fixed-point iteration is used if it fails or if the ABS is within dE
+	    of zero, where the residues are ill-conditioned and the fixed-point root is kept """
+	[hfe_A,mu_A] = sp.broadcast_arrays(sp.atleast_1d(sp.real(hfe)),sp.atleast_1d(sp.real(mu)))
+	if winit is None: winit = ABSinit_val*Delta
+	winit_A = winit*sp.ones(len(hfe_A))
+	## Delta(w) is real in gap, PhiC removes the phase
+	Hyb = lambda x: [SFg(x),sp.real(DFg(x)),SFD(x),sp.real(DFD(x))]
+	[wzero_A,Ok_A] = GapNewton(hfe_A,U*mu_A,Hyb,winit_A,Delta*sp.ones(len(hfe_A)))
+	for i in sp.nonzero(~Ok_A | (sp.fabs(wzero_A) <= dE))[0]:
+		eqn = lambda x: sp.sqrt(hfe_A[i]**2+(DFg(x)-U*mu_A[i])**2)/(1.0+SFg(x))
+		wzero = sp.real_if_close(fixed_point(eqn,winit_A[i]))
+		if sp.fabs(sp.imag(wzero)) > 1e-12:
+			print("# - Warning: AndreevEnergy: Non-zero Im w(ABS) = {0: .5e}".format(sp.imag(wzero)))
+		wzero_A[i] = sp.real(wzero)
+	if sp.ndim(hfe) == 0 and sp.ndim(mu) == 0: return sp.float64(wzero_A[0])
+	return wzero_A
 
 #####################################################################
 # Green function determinants #######################################
 
-def DetBand(hfe,mu,x):
-	""" determinant of the HF Green function in the band region (-inf:-DeltaMax)	"""
-	return x**2*(1.0+SFb(x))**2-hfe**2-(DFb(x)-U*mu)**2
+def DetBand(hfe,mu,x,S,D):
+	""" determinant of the HF Green function in the band region (-inf:-DeltaMax)
+	    S and D are the hybridizations at x, e.g. from HybTable """
+	return x**2*(1.0+S)**2-hfe**2-(D-U*mu)**2
 
 
-def DetGap(hfe,mu,x):
+def DetGap(hfe,mu,x,S,D):
 	""" determinant of the HF Green function in the fully gapped region (-DeltaMin:0)	
 	    real part only, residues at ABS must be added by hand """
-	return x**2*(1.0+SFg(x))**2-hfe**2-(DFg(x)-U*mu)*(sp.conj(DFg(x))-U*mu) #for sp.conj(Delta)!!!
+	return x**2*(1.0+S)**2-hfe**2-(D-U*mu)*(sp.conj(D)-U*mu) #for sp.conj(Delta)!!!
 
 
 def DetDiff(hfe,mu,x):
 	""" frequency derivative of the determinant of the HF Green function in gap region """
 	DDf = 2.0*x*(1.0+SFg(x))**2+2.0*x**2*(1.0+SFg(x))*SFD(x)\
 	-DFD(x)*(DFg(x)-U*mu)-DFD(x)*(DFg(x)-U*mu)
-	if DDf == 0.0: ## some resonance between terms?
+	if sp.any(DDf == 0.0): ## some resonance between terms?
 		print('# - Warning: DetDiff: dD/dw = 0, using value 0.01.')
-		DDf = 1e-2
+		DDf = sp.where(DDf == 0.0,1e-2,DDf)
 	return DDf
 
 #####################################################################
 # Green functions ###################################################
 
-def GFnBand(hfe,mu,x):
-	""" normal GF in band region """
-	return (x*(1.0+SFb(x))+hfe)/DetBand(hfe,mu,x)
-
-
-def GFnGap(hfe,mu,x):
-	""" normal GF in gap region """
-	return (x*(1.0+SFg(x))+hfe)/DetGap(hfe,mu,x)
-
-
-def GFaBand(hfe,mu,x):
-	""" anomalous GF in band region """
-	return -(DFb(x)-U*mu)/DetBand(hfe,mu,x)
-
-
-def GFaGap(hfe,mu,x):
-	""" anomalous GF in gap region """
-	return -(DFg(x)-U*mu)/DetGap(hfe,mu,x)
-
-
 def GFresidues(hfe,mu,wzero):
 	""" residues of the Green functions at ABS
 	    returns an array of three residues: normal electron, normal hole, anomalous """
@@ -170,28 +248,26 @@ def GFresidues(hfe,mu,wzero):
 	return sp.real(sp.array([NomNp,NomNh,NomA])/DetDiff(hfe,mu,wzero))
 
 
+def HFABSpos(wzero):
+	""" positions of the HF ABS -wzero and wzero on the energy axis,
+	    the lowest possible points -dE and dE if wzero is smaller than dE """
+	if sp.fabs(wzero) > dE: return [FindInEnergies(-wzero,En_A),FindInEnergies( wzero,En_A)]
+	return [FindInEnergies(-dE,En_A),FindInEnergies(dE,En_A)]
+
+
 def FillGreenHF(hfe,mu,wzero):
 	""" filling the arrays with HF Green functions """
-	## define the lambdas for given hfe and mu
-	GFn_band = lambda x: GFnBand(hfe,mu,x)
-	GFa_band = lambda x: GFaBand(hfe,mu,x)
-	GFn_gap  = lambda x: GFnGap(hfe,mu,x)
-	GFa_gap  = lambda x: GFaGap(hfe,mu,x)
-	## gap edge
-	zero_A = sp.array([0.0])
 	## find special points
-	if sp.fabs(wzero) > dE:
-		[ABSpos1,ABSpos2] = [FindInEnergies(-wzero,En_A),FindInEnergies( wzero,En_A)]
-	else:	# putting poles at lowest possible points
+	if sp.fabs(wzero) <= dE:	# putting poles at lowest possible points
 		print('# - Warning: FillGreenHF: ABS very close to Fermi energy.')
-		[ABSpos1,ABSpos2] = [FindInEnergies(-dE,En_A),FindInEnergies(dE,En_A)]
-	## fill the arrays
-	GFn_A = sp.concatenate((GFn_band(En_A[:EdgePos1]),sp.zeros(1)\
-	,GFn_gap(En_A[EdgePos1+1:EdgePos2])\
-	,sp.zeros(1),GFn_band(En_A[EdgePos2+1:])))
-	GFa_A = sp.concatenate((GFa_band(En_A[:EdgePos1]),sp.zeros(1),\
-	GFa_gap(En_A[EdgePos1+1:EdgePos2])\
-	,sp.zeros(1),GFa_band(En_A[EdgePos2+1:])))
+	[ABSpos1,ABSpos2] = HFABSpos(wzero)
+	## fill the arrays in band and gap regions, zero at gap edges
+	[S_A,D_A] = HybTable()
+	[GFn_A,GFa_A] = [sp.zeros(N,dtype = complex) for i in range(2)]
+	for [I,Det] in [[slice(0,EdgePos1),DetBand],[slice(EdgePos1+1,EdgePos2),DetGap],[slice(EdgePos2+1,N),DetBand]]:
+		Det_A = Det(hfe,mu,En_A[I],S_A[I],D_A[I])
+		GFn_A[I] =  (En_A[I]*(1.0+S_A[I])+hfe)/Det_A
+		GFa_A[I] = -(D_A[I]-U*mu)/Det_A
 	## calculate residues at ABS
 	[ResNp1,ResNh1,ResA1] = GFresidues(hfe,mu,-wzero)
 	[ResNp2,ResNh2,ResA2] = GFresidues(hfe,mu, wzero)
@@ -200,25 +276,60 @@ def FillGreenHF(hfe,mu,wzero):
 	GFa_A[ABSpos1]=-1.0j*ResA1 *sp.pi/dE
 	GFn_A[ABSpos2]=-1.0j*ResNp2*sp.pi/dE
 	GFa_A[ABSpos2]=-1.0j*ResA2 *sp.pi/dE
-	return [GFn_A,GFa_A,ABSpos1,ABSpos2]
+	ctype = StorageTypes()[1]
+	return [GFn_A.astype(ctype,copy = False),GFa_A.astype(ctype,copy = False),ABSpos1,ABSpos2]
 
 #####################################################################
 # Matsubara sums for HF calculations ################################
 
-def MSumsHF(hfe,mu,wzero,X_A):
+## band grids for MSumsHF, keys are (Delta,HFgrid,HFpoints)
+HFGrid_D = {}
+
+def HFGrid(Delta):
+	""" band energies X_A in (-100,-Delta) and integration weights W_A for MSumsHF
+	    HFgrid = 'uniform': step 1e-4, W_A = None (Simpson's rule by simps)
+	    HFgrid = 'graded': x = -Delta-t^2 with HFpoints uniform points in t, dense
+	    close to the gap edge where the integrands vary fast, Simpson weights
+	    include the Jacobian 2t, the point x = -Delta has zero weight and is left out """
+	key = (Delta,HFgrid,HFpoints)
+	if key not in HFGrid_D:
+		dX   = 1e-4         ## band energy sampling
+		Xmin = -100.0       ## lower cutoff for band energy
+		if HFgrid == 'graded':
+			Npts = HFpoints+1-HFpoints%2	## odd number of points for Simpson's rule
+			T_A = sp.linspace(0.0,sp.sqrt(-Xmin-Delta),Npts)
+			W_A = sp.ones(Npts)
+			W_A[1:-1:2] = 4.0
+			W_A[2:-1:2] = 2.0
+			W_A = W_A*(T_A[1]-T_A[0])/3.0*2.0*T_A
+			HFGrid_D[key] = [sp.flipud(-Delta-T_A**2)[:-1],sp.flipud(W_A)[:-1]]
+		else:
+			HFGrid_D[key] = [sp.arange(Xmin,-Delta,dX),None]
+	return HFGrid_D[key]
+
+
+@Counted
+def MSumsHF(hfe,mu,wzero,X_A,W_A = None):
 	"""	Matsubara sum of 1/Det(iw)
 		Matsubara sum of (iw(1+s(iw))+eps)/Det(iw)
-		Matsubara sum of sp.conj(Delta(iw))/Det(iw) """
-	Det_A   = DetBand(hfe,mu,X_A)
+		Matsubara sum of sp.conj(Delta(iw))/Det(iw)
+		W_A are integration weights on X_A, Simpson's rule on uniform X_A if None """
+	[S_A,D_A] = HybTable(X_A)
+	Det_A   = DetBand(hfe,mu,X_A,S_A,D_A)
 	Int1_A = sp.imag(Det_A)/(Det_A*sp.conj(Det_A))
-	Int2_A = X_A*(sp.imag(SFb(X_A))*sp.real(Det_A)-sp.imag(Det_A))/(Det_A*sp.conj(Det_A))
-	Int3_A = sp.imag(DFb(X_A))*sp.real(Det_A)/(Det_A*sp.conj(Det_A))
+	Int2_A = X_A*(sp.imag(S_A)*sp.real(Det_A)-sp.imag(Det_A))/(Det_A*sp.conj(Det_A))
+	Int3_A = sp.imag(D_A)*sp.real(Det_A)/(Det_A*sp.conj(Det_A))
 	Tail1 = -Int1_A[0]*X_A[0]/2.0	## behaves as -1/x^3
 	Tail2 = -Int2_A[0]*X_A[0]	## behaves as  1/x^2
 	Tail3 = -Int3_A[0]*X_A[0]/2.0	## behaves as  1/x^3
-	ContTerm1 =  (simps(Int1_A,X_A)+Tail1)/sp.pi
-	ContTerm2 = -(simps(Int2_A,X_A)+Tail2)/sp.pi
-	ContTerm3 = -(simps(Int3_A,X_A)+Tail3)/sp.pi
+	if W_A is None:
+		ContTerm1 =  (simps(Int1_A,X_A)+Tail1)/sp.pi
+		ContTerm2 = -(simps(Int2_A,X_A)+Tail2)/sp.pi
+		ContTerm3 = -(simps(Int3_A,X_A)+Tail3)/sp.pi
+	else:
+		ContTerm1 =  (sp.sum(W_A*Int1_A)+Tail1)/sp.pi
+		ContTerm2 = -(sp.sum(W_A*Int2_A)+Tail2)/sp.pi
+		ContTerm3 = -(sp.sum(W_A*Int3_A)+Tail3)/sp.pi
 	AndreevTerm1 =  1.0/DetDiff(hfe,mu,-wzero)
 	AndreevTerm2 = -wzero*(1.0+SFunctionGap(-wzero))/DetDiff(hfe,mu,-wzero)
 	AndreevTerm3 =  DeltaFunctionGap(-wzero)/DetDiff(hfe,mu,-wzero)
@@ -230,21 +341,67 @@ def MSumsHF(hfe,mu,wzero,X_A):
 #####################################################################
 # The Hartree-Fock solver ###########################################
 
-def SolveHF():
-	""" Hartree-Fock equations solver """
+## methods of scipy.optimize.root for the accelerated HF solver
+HFMethods_L = ['hybr','broyden1','anderson']
+
+def SolveHFroot(n,mu,wzero,X_A,W_A):
+	""" Hartree-Fock equations solved for n and mu as a root of x - F(x)
+	    using scipy.optimize.root with method HFmethod, n is fixed at half-filling
+	    every ABS energy starts from the previous one (GapNewton stays in the gap)
+	    returns [n,mu,wzero,k,success], k is the number of evaluations of MSumsHF """
+	ed = eps-U/2.0
+	Last_L = [wzero,0]	## last ABS energy and number of evaluations
+	def eqn(Y_A):
+		[nx,mux] = [0.5,Y_A[0]] if eps == 0.0 else Y_A
+		hfe = ed+U*nx
+		Last_L[0] = AndreevEnergy(hfe,mux,Last_L[0])
+		[D1,D2,D3] = sp.real(MSumsHF(hfe,mux,Last_L[0],X_A,W_A))
+		Last_L[1] += 1
+		mu_new = -D3/(1.0-U*D1)
+		if eps == 0.0: return sp.array([mux-mu_new])
+		return sp.array([nx-(D2+ed*D1)/(1.0-U*D1),mux-mu_new])
+	X0_A = sp.array([mu]) if eps == 0.0 else sp.array([n,mu])
+	try:
+		Sol = root(eqn,X0_A,method = HFmethod,tol = ConvHF)
+		Success = Sol.success
+	except (ValueError,RuntimeError):
+		Success = False
+	if not Success: return [n,mu,wzero,Last_L[1],False]
+	[n,mu] = [0.5,Sol.x[0]] if eps == 0.0 else Sol.x
+	wzero = AndreevEnergy(ed+U*n,mu,Last_L[0])
+	return [sp.float64(n),sp.float64(mu),wzero,Last_L[1],True]
+
+
+def SolveHF(Guess = None):
+	""" Hartree-Fock equations solver
+	    Guess = [n,mu,wzero] is the solution at a nearby point (continuation),
+	    the ABS energy is then also iterated from its previous value """
 	ed = eps-U/2.0            ## local energy level shifted to symmetry point
 	ErrMsg = 0                ## error message indicator
 	## filling the arrays #################################
-	dX   = 1e-4         ## band energy sampling
-	Xmin = -100.0       ## lower cutoff for band energy
-	X_A = sp.arange(Xmin,-Delta,dX)
+	[X_A,W_A] = HFGrid(Delta)
 	## initial conditions #################################
 	## change these if no convergence is achieved #########
-	n_siam = lambda x: 0.5 - sp.arctan((ed+U*x)/(GammaR+GammaL))/sp.pi	
-	n = fixed_point(n_siam,0.5)
-	mu = 0.2
-	hfe = ed+U*n
-	wzero = AndreevEnergy(hfe,mu)
+	if Guess is None:
+		n_siam = lambda x: 0.5 - sp.arctan((ed+U*x)/(GammaR+GammaL))/sp.pi	
+		n = fixed_point(n_siam,0.5)
+		mu = 0.2
+		hfe = ed+U*n
+		wzero = AndreevEnergy(hfe,mu)
+	else:
+		[n,mu,wzero] = Guess
+		if eps == 0.0: n = 0.5
+		hfe = ed+U*n
+		wzero = AndreevEnergy(hfe,mu,wzero)
+	t = time()
+	if HFmethod in HFMethods_L:
+		[n,mu,wzero,k,Success] = SolveHFroot(n,mu,wzero,X_A,W_A)
+		ProfCount('HF iterations',k)
+		if Success:
+			if chat: print('# - Converged after {0: 3d} evaluations ({1:s}, {2: .2f} s),  n = {3: .6f},  mu = {4: .6f}'\
+			.format(k,HFmethod,time()-t,float(n),float(mu)))
+			return sp.array([n,mu,wzero,ErrMsg])
+		print('# - Warning: SolveHF: no convergence using '+HFmethod+', using fixed-point iteration.')
 	n_old = 1e5
 	mu_old = 1e5
 	wzero_old = 1e5
@@ -254,11 +411,11 @@ def SolveHF():
                 sp.fabs(n-n_old)         > ConvHF]):
 		[n_old,mu_old,wzero_old] = [n,mu,wzero]
 		hfe = ed+U*n
-		[D1,D2,D3] = MSumsHF(hfe,mu,wzero,X_A)
+		[D1,D2,D3] = MSumsHF(hfe,mu,wzero,X_A,W_A)
 		mu = -D3/(1.0-U*D1)
 		n = 0.5 if eps == 0.0 else (D2+ed*D1)/(1.0-U*D1)
 		hfe = ed+U*n
-		wzero = AndreevEnergy(hfe,mu)
+		wzero = AndreevEnergy(hfe,mu,wzero)
 		if k > HF_max_iter: 
 			print('# - Error: SolveHF: No convergence after {0: 5d} iterations, exit.'.format(k))
 			n = mu = wzero = -1.0
@@ -271,9 +428,165 @@ def SolveHF():
 			print('# - Warning: SolveHF: neglecting non-zero Im mu = {0: .5e}'.format(sp.imag(mu)))
 		mu = sp.real(mu)
 		k += 1
-	if chat: print('# - Converged after {0: 3d} iterations,  n = {1: .6f},  mu = {2: .6f}'\
-	.format(k,float(n),float(mu)))
+	ProfCount('HF iterations',k)
+	if chat: print('# - Converged after {0: 3d} iterations ({1: .2f} s),  n = {2: .6f},  mu = {3: .6f}'\
+	.format(k,time()-t,float(n),float(mu)))
 	return sp.array([n,mu,wzero,ErrMsg])
 
+#####################################################################
+# batched Hartree-Fock solver #######################################
+
+## maximum number of elements of the (points,grid) arrays in BatchMSumsHF,
+## about 30 MB per complex array, larger batches are calculated in chunks
+HFBatchSize = 2**21
+
+def BatchParams(Params_L):
+	""" dictionary of parameter arrays for a list of PhysParams dictionaries,
+	    DeltaPhase = Delta exp(i PhiC) (GammaL exp(-i Phi/2) + GammaR exp(i Phi/2)) as in HybPhase,
+	    real by the choice of PhiC, the rounding errors in the imaginary part are dropped """
+	B_D = dict([(name,sp.array([float(Params[name]) for Params in Params_L]))\
+	for name in ['U','eps','Delta','GammaL','GammaR','Phi']])
+	B_D['ed'] = B_D['eps']-B_D['U']/2.0
+	B_D['GammaTot'] = B_D['GammaL']+B_D['GammaR']
+	PhiC_A = sp.arctan((B_D['GammaL']-B_D['GammaR'])/(B_D['GammaTot']+1e-12)*sp.tan(B_D['Phi']/2.0))
+	B_D['DeltaPhase'] = sp.real(B_D['Delta']*sp.exp(1.0j*PhiC_A)\
+	*(B_D['GammaL']*sp.exp(-1.0j*B_D['Phi']/2.0) + B_D['GammaR']*sp.exp(1.0j*B_D['Phi']/2.0)))
+	return B_D
+
+
+def BatchSelect(B_D,I_A):
+	""" parameter arrays of the points I_A """
+	return dict([(name,B_D[name][I_A]) for name in B_D])
+
+
+def BatchGapHyb(x,B_D):
+	""" S, Delta and their energy derivatives in gap, x is an array of energies, one per point """
+	R_A = 1.0/sp.sqrt(B_D['Delta']**2-x**2)
+	dR_A = x*R_A**3
+	return [B_D['GammaTot']*R_A,B_D['DeltaPhase']*R_A,B_D['GammaTot']*dR_A,B_D['DeltaPhase']*dR_A]
+
+
+def BatchDetDiff(hfe,mu,x,B_D):
+	""" DetDiff for arrays of points """
+	[S_A,D_A,dS_A,dD_A] = BatchGapHyb(x,B_D)
+	DDf_A = 2.0*x*(1.0+S_A)**2+2.0*x**2*(1.0+S_A)*dS_A-2.0*dD_A*(D_A-B_D['U']*mu)
+	if any(DDf_A == 0.0):
+		print('# - Warning: BatchDetDiff: dD/dw = 0, using value 0.01.')
+		DDf_A[DDf_A == 0.0] = 1e-2
+	return DDf_A
+
+
+def AndreevMap(x,hfe,mu,B_D):
+	""" right-hand side of the fixed-point equation for the HF ABS energy, see AndreevEnergy """
+	[S_A,D_A] = BatchGapHyb(x,B_D)[:2]
+	return sp.sqrt(hfe**2+(D_A-B_D['U']*mu)**2)/(1.0+S_A)
+
+
+def BatchAndreevEnergy(hfe,mu,B_D,winit = None):
+	""" HF ABS energies for arrays of points, solved together by GapNewton, the points
+	    where it fails or the ABS is within dE of zero by fixed_point (see AndreevEnergy),
+	    NaN for the points that do not converge """
+	if winit is None: winit = ABSinit_val*B_D['Delta']
+	[wzero_A,Ok_A] = GapNewton(hfe,B_D['U']*mu,lambda x: BatchGapHyb(x,B_D),winit,B_D['Delta'])
+	for i in sp.nonzero(~Ok_A | (sp.fabs(wzero_A) <= dE))[0]:
+		try:
+			wzero_A[i] = sp.real(fixed_point(AndreevMap,winit[i:i+1],args = (hfe[i:i+1],mu[i:i+1],BatchSelect(B_D,[i])))[0])
+		except RuntimeError:
+			wzero_A[i] = sp.nan
+	return wzero_A
+
+
+def BatchMSumsHF(hfe,mu,wzero,X_A,W_A,B_D):
+	""" MSumsHF for arrays of points with the same Delta, the integrands are (points,grid) arrays
+	    returns [D1_A,D2_A,D3_A] """
+	Base_A = 1.0j*sp.sign(X_A)/sp.sqrt(X_A**2-B_D['Delta'][0]**2)	## band hybridizations are multiples of it
+	[D1_A,D2_A,D3_A] = [sp.zeros(len(hfe)) for i in range(3)]
+	nb = max(int(HFBatchSize/len(X_A)),1)
+	for I in [slice(i,i+nb) for i in range(0,len(hfe),nb)]:
+		S_A = B_D['GammaTot'][I,None]*Base_A
+		D_A = B_D['DeltaPhase'][I,None]*Base_A
+		Det_A = X_A**2*(1.0+S_A)**2-hfe[I,None]**2-(D_A-(B_D['U']*mu)[I,None])**2
+		Abs2_A = sp.real(Det_A*sp.conj(Det_A))
+		Int_L = [sp.imag(Det_A)/Abs2_A,X_A*(sp.imag(S_A)*sp.real(Det_A)-sp.imag(Det_A))/Abs2_A,\
+		sp.imag(D_A)*sp.real(Det_A)/Abs2_A]
+		## tails behave as -1/x^3, 1/x^2 and 1/x^3
+		Tail_L = [-Int_L[0][:,0]*X_A[0]/2.0,-Int_L[1][:,0]*X_A[0],-Int_L[2][:,0]*X_A[0]/2.0]
+		if W_A is None: Sum_L = [simps(Int_A,X_A,axis = -1) for Int_A in Int_L]
+		else:           Sum_L = [sp.dot(Int_A,W_A) for Int_A in Int_L]
+		[D1_A[I],D2_A[I],D3_A[I]] = [(Sum_L[0]+Tail_L[0])/sp.pi,-(Sum_L[1]+Tail_L[1])/sp.pi,-(Sum_L[2]+Tail_L[2])/sp.pi]
+	## Andreev terms
+	DDf_A = BatchDetDiff(hfe,mu,-wzero,B_D)
+	[S_A,D_A] = BatchGapHyb(-wzero,B_D)[:2]
+	D1_A = D1_A+sp.real(1.0/DDf_A)
+	D2_A = D2_A+sp.real(-wzero*(1.0+S_A)/DDf_A)
+	D3_A = D3_A+sp.real(D_A/DDf_A)
+	return [D1_A,D2_A,D3_A]
+
+
+def BatchResidues(hfe,mu,wzero,B_D):
+	""" GFresidues for arrays of points, returns a (points,3) array """
+	[S_A,D_A] = BatchGapHyb(wzero,B_D)[:2]
+	Nom_A = sp.array([wzero*(1.0+S_A)+hfe,wzero*(1.0+S_A)-hfe,-(D_A-B_D['U']*mu)])
+	return sp.real(Nom_A/BatchDetDiff(hfe,mu,wzero,B_D)).T
+
+
+def SolveHFBatch(Params_L,Guess = None):
+	""" Hartree-Fock equations for a list of PhysParams dictionaries, all points are iterated
+	    together by the fixed-point method (HFmethod is not used) on (points,grid) arrays,
+	    converged points are removed from the iteration, points with the same Delta share the grid
+	    Guess is a (points,3) array of [n,mu,wzero] (continuation) or None
+	    returns [n_A,mu_A,wzero_A,ErrMsg_A,Res_A], Res_A[:,0] and Res_A[:,1] are the residues
+	    of GFresidues at -wzero and wzero, failed points have ErrMsg = 1 and n = mu = wzero = -1 """
+	B_D = BatchParams(Params_L)
+	NP = len(Params_L)
+	[n_A,mu_A,wzero_A] = [sp.zeros(NP) for i in range(3)]
+	ErrMsg_A = sp.zeros(NP,dtype = int)
+	Res_A = sp.zeros([NP,2,3])
+	t = time()
+	Iter_A = sp.zeros(NP,dtype = int)
+	for Delta_g in sp.unique(B_D['Delta']):
+		I_A = sp.nonzero(B_D['Delta'] == Delta_g)[0]
+		G_D = BatchSelect(B_D,I_A)
+		[X_A,W_A] = HFGrid(Delta_g)
+		[ed,U] = [G_D['ed'],G_D['U']]
+		## initial conditions, as in SolveHF
+		if Guess is None:
+			n = fixed_point(lambda x: 0.5 - sp.arctan((ed+U*x)/G_D['GammaTot'])/sp.pi,0.5*sp.ones(len(I_A)))
+			mu = 0.2*sp.ones(len(I_A))
+			wzero = BatchAndreevEnergy(ed+U*n,mu,G_D)
+		else:
+			[n,mu,wzero] = sp.array(Guess,dtype = float)[I_A].T
+			n = sp.where(G_D['eps'] == 0.0,0.5,n)
+			wzero = BatchAndreevEnergy(ed+U*n,mu,G_D,wzero)
+		## fixed-point iteration of the active points
+		Act_A = sp.arange(len(I_A))
+		Err_A = sp.isnan(wzero)
+		Act_A = Act_A[~Err_A]
+		while len(Act_A) > 0:
+			A_D = BatchSelect(G_D,Act_A)
+			[n1,mu1,w1] = [n[Act_A],mu[Act_A],wzero[Act_A]]
+			[D1,D2,D3] = BatchMSumsHF(A_D['ed']+A_D['U']*n1,mu1,w1,X_A,W_A,A_D)
+			mu2 = -D3/(1.0-A_D['U']*D1)
+			n2 = sp.where(A_D['eps'] == 0.0,0.5,(D2+A_D['ed']*D1)/(1.0-A_D['U']*D1))
+			w2 = BatchAndreevEnergy(A_D['ed']+A_D['U']*n2,mu2,A_D,w1)
+			[n[Act_A],mu[Act_A],wzero[Act_A]] = [n2,mu2,w2]
+			Iter_A[I_A[Act_A]] += 1
+			Conv_A = (sp.fabs(w2-w1) <= ConvHF) & (sp.fabs(mu2-mu1) <= ConvHF) & (sp.fabs(n2-n1) <= ConvHF)
+			Fail_A = ~Conv_A & (sp.isnan(w2) | (Iter_A[I_A[Act_A]] > HF_max_iter))
+			Err_A[Act_A[Fail_A]] = True
+			Act_A = Act_A[~Conv_A & ~Fail_A]
+		## residues of the converged points
+		Ok_A = sp.nonzero(~Err_A)[0]
+		O_D = BatchSelect(G_D,Ok_A)
+		hfe = O_D['ed']+O_D['U']*n[Ok_A]
+		Res_A[I_A[Ok_A],0] = BatchResidues(hfe,mu[Ok_A],-wzero[Ok_A],O_D)
+		Res_A[I_A[Ok_A],1] = BatchResidues(hfe,mu[Ok_A], wzero[Ok_A],O_D)
+		[n[Err_A],mu[Err_A],wzero[Err_A]] = [-1.0,-1.0,-1.0]
+		[n_A[I_A],mu_A[I_A],wzero_A[I_A],ErrMsg_A[I_A]] = [n,mu,wzero,Err_A]
+	ProfCount('HF iterations',int(sp.sum(Iter_A)))
+	if chat: print('# - SolveHFBatch: {0: 3d} points, {1: 3d} failed, {2: 3d} iterations at most ({3: .2f} s)'\
+	.format(NP,int(sp.sum(ErrMsg_A)),int(sp.amax(Iter_A)) if NP > 0 else 0,time()-t))
+	return [n_A,mu_A,wzero_A,ErrMsg_A,Res_A]
+
 ## squadlib1.py end ##
 
@@ -10,22 +10,48 @@
 
 from config_squad import *
 from squadlib1 import *
-from scipy.fftpack import fft,ifft
-from scipy.interpolate import InterpolatedUnivariateSpline
+from squadfft import FFTr,IFFTr
+from squadprof import Counted
+from scipy.optimize import root
+from os import path,rename,getpid
+from collections import OrderedDict
 
 #############################
 ##### List of functions: ####
 # WriteFile
+# PadBuffer
+# PadFFT
+# UnpadIFFT
+# Symmetric
+# SplitParity
+# SymmetricFFT
+# Bubbles
+# BubblePoles
 # TwoParticleBubbles
 # SelfEnergy
+# SelfEnergySymmetric
+# KramersKronigKernel
 # KramersKronigFFT
+# KramersKronigFFT_ABS
+# ComplexArray
 # GreensFunction
+# GapCubic
+# GapValue
+# GapRoots
 # FindABS
 # FillGreensFunction
+# HoleSelfEnergies
+# DysonGreensFunction
+# PutResidues
+# GreensFunctionKK
 # MSumsInt
 # IntDOS
+# Densities
 # ElectronDensity
 # CooperPairDensity
+# BrentqWarm
+# StaticSelfEnergy
+# StaticSelfEnergy2D
 # JosephsonCurrent
 
 #####################################################################
@@ -34,147 +60,350 @@ from scipy.interpolate import InterpolatedUnivariateSpline
 def WriteFile(Xn_A,Xa_A,pole_pos,f_type):
 	"""	writes an output file suitable for gnuplot
 	range for output is (-Emax:Emax) with step NE x dE
-	pole_pos guarantees we don't miss the poles (ABS) """
+	pole_pos guarantees we don't miss the poles (ABS)
+	WriteFormat = 'npz' writes the same points to a NumPy .npz file,
+	the parameters from the header are stored as separate entries """
 	[kmin,kmax]           = [FindInEnergies(-EmaxFiles,En_A),FindInEnergies(EmaxFiles,En_A)]
 	[xzeroPos1,xzeroPos2] = [FindInEnergies(-pole_pos,En_A), FindInEnergies(pole_pos,En_A) ]
+	## every EstepFiles-th point and the poles
+	Idx_A = sp.union1d(sp.arange(kmin,kmax,EstepFiles),\
+	[k for k in [xzeroPos1,xzeroPos2] if kmin <= k < kmax])
 	filename = ""
-	fname = filename+f_type+'.dat'
-	f = open(fname,'w')
-	header = '# U='+str(U)+', Delta='+str(Delta)+', eps='+str(eps)+', Phi/pi='+str(P)\
-	+'\n# GammaR='+str(GammaR)+', GammaL='+str(GammaL)+'\n'
-	header += '# generated by '+str(argv[0])+'; '+ctime()+'\n'
-	f.write(header)
-	for k in range(len(En_A[kmin:kmax])):
-		if any([k%EstepFiles == 0,k == xzeroPos1-kmin,k == xzeroPos2-kmin]):
-			gline = '{0:.5f}\t{1:.8f}\t{2:.8f}\t{3:.8f}\t{4:.8f}'\
-			.format(float(En_A[k+kmin]),float(sp.real(Xn_A[k+kmin])),float(sp.imag(Xn_A[k+kmin]))\
-			,float(sp.real(Xa_A[k+kmin])),float(sp.imag(Xa_A[k+kmin])))+'\n'
-			f.write(gline)	
-	f.close()
+	if WriteFormat == 'npz':
+		fname = filename+f_type+'.npz'
+		sp.savez(fname,En_A = En_A[Idx_A],Xn_A = Xn_A[Idx_A],Xa_A = Xa_A[Idx_A]\
+		,U = U,Delta = Delta,eps = eps,P = P,GammaR = GammaR,GammaL = GammaL\
+		,generator = str(argv[0]),date = ctime())
+	else:
+		fname = filename+f_type+'.dat'
+		header = '# U='+str(U)+', Delta='+str(Delta)+', eps='+str(eps)+', Phi/pi='+str(P)\
+		+'\n# GammaR='+str(GammaR)+', GammaL='+str(GammaL)+'\n'
+		header += '# generated by '+str(argv[0])+'; '+ctime()+'\n'
+		Data_A = sp.column_stack([En_A[Idx_A],sp.real(Xn_A[Idx_A]),sp.imag(Xn_A[Idx_A])\
+		,sp.real(Xa_A[Idx_A]),sp.imag(Xa_A[Idx_A])])
+		f = open(fname,'w')
+		f.write(header)
+		sp.savetxt(f,Data_A,fmt = ['%.5f','%.8f','%.8f','%.8f','%.8f'],delimiter = '\t')
+		f.close()
 	if chat: print('#   file '+fname+' written.')
 
 #####################################################################
 # convolution procedures using FFT ##################################
 
+## zero-padded work arrays of length 2N+2, keys are (N,dtype,shape)
+## the zeros in the middle are never overwritten, only the ends are filled
+Workspace_D = {}
+
+def PadBuffer(shape = ()):
+	""" preallocated work array for PadFFT, shape is () or (phases,) for batched arrays """
+	key = (N,StorageTypes()[0],shape)
+	if key not in Workspace_D:
+		for oldkey in [k for k in Workspace_D if k[:2] != key[:2]]: del Workspace_D[oldkey]	## keep only the current grid
+		Workspace_D[key] = sp.zeros(shape+(2*N+2,),dtype = key[1])
+	return Workspace_D[key]
+
+
+def PadFFT(X_A,F_A = None):
+	""" zero-padding of a real array to double the size (2N+2)
+	    and its real-input Fourier transform (N+2 points)
+	    if F_A is given, F_A*X_A is transformed without a temporary array
+	    X_A can be a (phases,N) array, then every row is padded and transformed """
+	Pad_A = PadBuffer(X_A.shape[:-1])
+	if F_A is None:
+		Pad_A[...,:N-Nhalf] = X_A[...,Nhalf:]
+		Pad_A[...,N+2+N-Nhalf:] = X_A[...,:Nhalf]
+	else:
+		sp.multiply(X_A[...,Nhalf:],F_A[Nhalf:],out = Pad_A[...,:N-Nhalf])
+		sp.multiply(X_A[...,:Nhalf],F_A[:Nhalf],out = Pad_A[...,N+2+N-Nhalf:])
+	return FFTr(Pad_A)
+
+
+def UnpadIFFT(ftX_A):
+	""" inverse of PadFFT, returns real array of length N (along the last axis) """
+	X_A = IFFTr(ftX_A,2*N+2)
+	return sp.concatenate([X_A[...,3*Nhalf+4:],X_A[...,:Nhalf+1]],axis = -1)
+
+
+def CrossCorrelation(ftFX_A,ftX_A):
+	""" (-conj(ftFX)*ftX + ftFX*conj(ftX))*dE for the bubbles, in place of ftX_A
+	    the sum is 2i Im(ftFX*conj(ftX)), a conjugate pair has the same product """
+	sp.conj(ftX_A,out = ftX_A)
+	ftX_A *= ftFX_A
+	ftX_A.real = 0.0
+	ftX_A.imag *= 2.0*dE
+	return ftX_A
+
+
+def Convolution(ctFCG_A,ctCG_A,ftFX_A,ftX_A):
+	""" (conj(ftFCG)*ftX - ftFX*conj(ftCG))*dE for the self-energy, in place of ftX_A
+	    ctFCG_A and ctCG_A are the conjugated transforms of the kernel """
+	ftX_A *= ctFCG_A
+	ftFX_A *= ctCG_A
+	ftX_A -= ftFX_A
+	ftX_A *= dE
+	return ftX_A
+
+
+def Symmetric():
+	""" particle-hole symmetry at half-filling (eps = 0) is used if PHsymmetry is set,
+	    Gn and SEn are then -conj, Ga, SEa and the determinant conj of themselves at -w """
+	return bool(PHsymmetry) and eps == 0.0
+
+
+def SplitParity(X_A):
+	""" even and odd parts of X_A in energy (along the last axis), returns [Even_A,Odd_A] """
+	Flip_A = X_A[...,::-1]	## a view
+	return [(X_A+Flip_A)/2.0,(X_A-Flip_A)/2.0]
+
+
+def SymmetricFFT(ftFX_A,parity):
+	""" transform of X_A from the transform of FD_A*X_A (PadFFT), X_A even (parity = 1) or odd (-1)
+	    in energy: X_A is FD_A*X_A plus its mirror image and mirroring conjugates the transform """
+	ftX_A = sp.zeros_like(ftFX_A)
+	if parity > 0: ftX_A.real = 2.0*ftFX_A.real
+	else:          ftX_A.imag = 2.0*ftFX_A.imag
+	return ftX_A
+
+
+def Bubbles(GFn_A,GFa_A,Poles_L = None):
+	""" two-particle bubbles, GFn_A and GFa_A can be (phases,N) arrays, then all phases
+	    are calculated at once, Poles_L are the positions of the delta peaks from BubblePoles
+	    (a list of them for (phases,N) arrays), subtracted in the KK transform if KKpoles is set """
+	## zero-padding of the arrays to double the size, each transformed only once
+	## sp.imag of a complex array is a view, no copy
+	ImGFp_A = sp.imag(GFn_A)
+	ImGFa_A = sp.imag(GFa_A)
+	if Symmetric():	## Im Gn even, Im Ga odd, the plain transforms are not needed
+		ftFX_A = PadFFT(ImGFp_A,FD_A)
+		ImChin_A = UnpadIFFT(CrossCorrelation(ftFX_A,SymmetricFFT(ftFX_A, 1)))
+		ftFX_A = PadFFT(ImGFa_A,FD_A)
+		ImChia_A = UnpadIFFT(CrossCorrelation(ftFX_A,SymmetricFFT(ftFX_A,-1)))
+		del ftFX_A
+	else:
+		## perform convolution/cross-correlation via FFT, normal part
+		ImChin_A = UnpadIFFT(CrossCorrelation(PadFFT(ImGFp_A,FD_A),PadFFT(ImGFp_A)))
+		## perform convolution/cross-correlation via FFT, anomalous part
+		ImChia_A = UnpadIFFT(CrossCorrelation(PadFFT(ImGFa_A,FD_A),PadFFT(ImGFa_A)))
+	ImChin_A /= sp.pi
+	ImChia_A /= sp.pi
+	## find real part from imaginary using KK relations
+	if KKpoles and Poles_L is not None:
+		Chin_A = ComplexArray(KramersKronigFFT_ABS(ImChin_A,Poles_L),ImChin_A)
+		Chia_A = ComplexArray(KramersKronigFFT_ABS(ImChia_A,Poles_L),ImChia_A)
+	else:
+		Chin_A = ComplexArray(KramersKronigFFT(ImChin_A),ImChin_A)
+		Chia_A = ComplexArray(KramersKronigFFT(ImChia_A),ImChia_A)
+	return [Chin_A,Chia_A]
+
+
+def BubblePoles(wzero):
+	""" positions of the delta peaks of the bubbles at -2wzero and 2wzero,
+	    the cross-correlation of the HF ABS peaks at HFABSpos, shifted by their distance """
+	[ABSpos1,ABSpos2] = HFABSpos(wzero)
+	return [Nhalf-(ABSpos2-ABSpos1),Nhalf+(ABSpos2-ABSpos1)]
+
+
 def TwoParticleBubbles(GFn_A,GFa_A,wzero):
 	""" calculates the two-particle bubbles """
-	## zero-padding of the arrays to double the size
-	FDex_A  = sp.concatenate([FD_A[Nhalf:],sp.zeros(N+2),FD_A[:Nhalf]])
-	ImGFp_A = sp.concatenate([sp.imag(GFn_A[Nhalf:]),sp.zeros(N+2),sp.imag(GFn_A[:Nhalf])])
-	ImGFa_A = sp.concatenate([sp.imag(GFa_A[Nhalf:]),sp.zeros(N+2),sp.imag(GFa_A[:Nhalf])])
-	## perform convolution/cross-correlation via FFT, normal part
-	ftImChin1_A = -sp.conj(fft(FDex_A*ImGFp_A))*fft(ImGFp_A)*dE
-	ftImChin2_A = fft(FDex_A*ImGFp_A)*sp.conj(fft(ImGFp_A))*dE
-	ImChin_A = sp.real(ifft(ftImChin1_A+ftImChin2_A))/sp.pi
-	ImChin_A = sp.concatenate([ImChin_A[3*Nhalf+4:],ImChin_A[:Nhalf+1]])
-	## perform convolution/cross-correlation via FFT, anomalous part
-	ftImChia1_A = -sp.conj(fft(FDex_A*ImGFa_A))*fft(ImGFa_A)*dE
-	ftImChia2_A = fft(FDex_A*ImGFa_A)*sp.conj(fft(ImGFa_A))*dE
-	ImChia_A = sp.real(ifft(ftImChia1_A+ftImChia2_A))/sp.pi
-	ImChia_A = sp.concatenate([ImChia_A[3*Nhalf+4:],ImChia_A[:Nhalf+1]])
-	## find ABS positions 2 x w0 on the energy axis
-	if sp.fabs(wzero)>dE:
-		ABSposChi1 = FindInEnergies(-2.0*wzero,En_A)-1
-		ABSposChi2 = FindInEnergies( 2.0*wzero,En_A)+1
-	else:  ## putting poles at lowest possible points
+	## ABS positions 2 x w0 on the energy axis
+	if sp.fabs(wzero) <= dE:  ## poles at lowest possible points
 		print("# - Warning: TwoParticleBubbles: ABS energy smaller than energy resolution.")
-		ABSposChi1 = FindInEnergies(-2.0*dE,En_A)
-		ABSposChi2 = FindInEnergies( 2.0*dE,En_A)
-	## extract residues
-	#ResChin1 = -ImChin_A[ABSposChi1]*dE/sp.pi
-	#ResChin2 = -ImChin_A[ABSposChi2]*dE/sp.pi
-	#ResChia1 = -ImChia_A[ABSposChi1]*dE/sp.pi
-	#ResChia2 = -ImChia_A[ABSposChi2]*dE/sp.pi
-	#print(ResChin1,ResChin2,ResChia1,ResChia2)
-	## find real part from imaginary using KK relations
-	#Chin_A = KramersKronigFFT_ABS(ImChin_A,[ABSposChi1,ABSposChi2],[ResChin1,ResChin2]) + 1.0j*ImChin_A
-	#Chia_A = KramersKronigFFT_ABS(ImChia_A,[ABSposChi1,ABSposChi2],[ResChia1,ResChia2]) + 1.0j*ImChia_A
-	Chin_A = KramersKronigFFT(ImChin_A) + 1.0j*ImChin_A
-	Chia_A = KramersKronigFFT(ImChia_A) + 1.0j*ImChia_A
-	## remove the possibly diverging element from the real part
-	#Chin_A[ABSposChi1] = 1.0j*sp.imag(Chin_A[ABSposChi1])
-	#Chin_A[ABSposChi2] = 1.0j*sp.imag(Chin_A[ABSposChi2])
-	#Chia_A[ABSposChi1] = 1.0j*sp.imag(Chia_A[ABSposChi1])
-	#Chia_A[ABSposChi2] = 1.0j*sp.imag(Chia_A[ABSposChi2])
+	[ABSposChi1,ABSposChi2] = BubblePoles(wzero)
+	[Chin_A,Chia_A] = Bubbles(GFn_A,GFa_A,[ABSposChi1,ABSposChi2])
 	return [Chin_A,Chia_A,ABSposChi1,ABSposChi2]
 
 
 def SelfEnergy(GFn_A,GFa_A,ChiGamma_A):
-	""" calculates the dynamical self-energies from Schwinger-Dyson equation """
-	## zero-padding the arrays to double the size
-	FDex_A  = sp.concatenate([FD_A[Nhalf:],sp.zeros(N+2),FD_A[:Nhalf]])
-	ImGFn_A = sp.concatenate([sp.imag(GFn_A[Nhalf:]),sp.zeros(N+2),sp.imag(GFn_A[:Nhalf])])
-	ImGFa_A = sp.concatenate([sp.imag(GFa_A[Nhalf:]),sp.zeros(N+2),sp.imag(GFa_A[:Nhalf])])
-	ImCG_A  = sp.concatenate([sp.imag(ChiGamma_A[Nhalf:]),sp.zeros(N+2),sp.imag(ChiGamma_A[:Nhalf])])
+	""" calculates the dynamical self-energies from Schwinger-Dyson equation
+	    the arrays can be (phases,N), then all phases are calculated at once """
+	## zero-padding the arrays to double the size, each transformed only once
+	ImGFn_A = sp.imag(GFn_A)
+	ImGFa_A = sp.imag(GFa_A)
+	ImCG_A  = sp.imag(ChiGamma_A)
+	if Symmetric(): return SelfEnergySymmetric(ImGFn_A,ImGFa_A,ImCG_A)
+	## conjugated in place, the plain transforms are not needed
+	ftFCG_A  = sp.conj(PadFFT(ImCG_A,FD_A))
+	ftCG_A   = PadFFT(ImCG_A)
+	sp.conj(ftCG_A,out = ftCG_A)
 	## perform convolution/cross-correlation via FFT, normal part 
-	ftImSEn1_A = sp.conj(fft(FDex_A*ImCG_A))*fft(ImGFn_A)*dE
-	ftImSEn2_A = -fft(FDex_A*ImGFn_A)*sp.conj(fft(ImCG_A))*dE
-	ImSEn_A = sp.real(ifft(ftImSEn1_A+ftImSEn2_A))/sp.pi
-	ImSEn_A = sp.concatenate([ImSEn_A[3*Nhalf+4:],ImSEn_A[:Nhalf+1]])
+	ImSEn_A = UnpadIFFT(Convolution(ftFCG_A,ftCG_A,PadFFT(ImGFn_A,FD_A),PadFFT(ImGFn_A)))
+	ImSEn_A /= sp.pi
 	## perform convolution/cross-correlation via FFT, anomalous part 
-	ftImSEa1_A = sp.conj(fft(FDex_A*ImCG_A))*fft(ImGFa_A)*dE
-	ftImSEa2_A = -fft(FDex_A*ImGFa_A)*sp.conj(fft(ImCG_A))*dE
-	ImSEa_A = sp.real(ifft(ftImSEa1_A+ftImSEa2_A))/sp.pi
-	ImSEa_A = sp.concatenate([ImSEa_A[3*Nhalf+4:],ImSEa_A[:Nhalf+1]])
+	ImSEa_A = UnpadIFFT(Convolution(ftFCG_A,ftCG_A,PadFFT(ImGFa_A,FD_A),PadFFT(ImGFa_A)))
+	ImSEa_A /= sp.pi
 	## find real part from imaginary using KK relations
-	Sigman_A = KramersKronigFFT(ImSEn_A) + 1.0j*ImSEn_A
-	Sigmaa_A = KramersKronigFFT(ImSEa_A) + 1.0j*ImSEa_A
+	## no delta peaks here, the ABS-bubble terms cancel at zero temperature
+	Sigman_A = ComplexArray(KramersKronigFFT(ImSEn_A),ImSEn_A)
+	Sigmaa_A = ComplexArray(KramersKronigFFT(ImSEa_A),ImSEa_A)
 	return [Sigman_A,Sigmaa_A]
 
 
-def KramersKronigFFT(ImX_A):
-	""" Hilbert transform used to calculate real part of a function from its imaginary part
-         uses piecewise cubic interpolated integral kernel of the Hilbert transform
-         assumes that Im X (\infty)=0 """
+def SelfEnergySymmetric(ImGFn_A,ImGFa_A,ImCG_A):
+	""" SelfEnergy at half-filling, Im Gn and Im SEn are even, Im Ga, Im SEa and Im ChiGamma odd
+	    the plain transforms follow from the FD-weighted ones (SymmetricFFT), the normal and
+	    anomalous parts are summed and separated as even and odd parts after a single
+	    inverse transform and a single KK transform, the real part of an even function is odd """
+	ftFCG_A = PadFFT(ImCG_A,FD_A)
+	ftCG_A  = SymmetricFFT(ftFCG_A,-1)
+	sp.conj(ftFCG_A,out = ftFCG_A)
+	sp.conj(ftCG_A,out = ftCG_A)
+	ftFX_A = PadFFT(ImGFn_A,FD_A)
+	ftSE_A = Convolution(ftFCG_A,ftCG_A,ftFX_A,SymmetricFFT(ftFX_A, 1))
+	ftFX_A = PadFFT(ImGFa_A,FD_A)
+	ftSE_A += Convolution(ftFCG_A,ftCG_A,ftFX_A,SymmetricFFT(ftFX_A,-1))
+	del ftFX_A,ftFCG_A,ftCG_A
+	ImSE_A = UnpadIFFT(ftSE_A)	## Im SEn + Im SEa
+	ImSE_A /= sp.pi
+	[ReSEa_A,ReSEn_A] = SplitParity(KramersKronigFFT(ImSE_A))
+	[ImSEn_A,ImSEa_A] = SplitParity(ImSE_A)
+	return [ComplexArray(ReSEn_A,ImSEn_A),ComplexArray(ReSEa_A,ImSEa_A)]
+
+
+## Fourier transforms of the Kramers-Kronig kernel, keys are (N,dtype)
+KernelCache_D = {}
+
+def KramersKronigKernel(N,dtype='float64'):
+	""" real-input Fourier transform of the zero-padded integral kernel of the Hilbert transform
+	    depends only on N, kept in KernelCache_D and, if KernelDir is set,
+	    stored in KernelDir as a .npy file for later runs, a file that cannot be read is recalculated
+	    dtype is the type of the transformed data, float64 or float32 """
+	key = (N,str(dtype))
+	if key in KernelCache_D: return KernelCache_D[key]
+	ctype = 'complex64' if str(dtype) == 'float32' else 'complex128'
+	fname = path.join(KernelDir,'KKkernel_N'+str(N)+'_'+ctype+'.npy') if KernelDir != '' else ''
+	if fname != '' and path.isfile(fname):
+		try: ftKernelExt_A = sp.load(fname)
+		except (IOError,ValueError): ftKernelExt_A = []	## damaged file, recalculated
+		if len(ftKernelExt_A) == N+2:
+			KernelCache_D[key] = ftKernelExt_A
+			return ftKernelExt_A
+	Nhalf = int((N-1)/2)
 	if N > 3e6: A = sp.arange(3,Nhalf+1,dtype='float64')	## be careful with the data type!!!
 	else:       A = sp.arange(3,Nhalf+1)  
-	#A = sp.arange(3,N+1,dtype='float64')
 	X1 = 4.0*sp.log(1.5)
 	X2 = 10.0*sp.log(4.0/3.0)-6.0*sp.log(1.5)
 	## filling the kernel	
-	if N > 3e6: Kernel_A = sp.zeros(Nhalf-2,dtype='float64')
-	else:       Kernel_A = sp.zeros(Nhalf-2)
-	#Kernel_A = sp.zeros(N-2,dtype='float64')
 	Kernel_A = (1-A**2)*((A-2)*sp.arctanh(1.0/(1-2*A))+(A+2)*sp.arctanh(1.0/(1+2*A)))\
 	+((A**3-6*A**2+11*A-6)*sp.arctanh(1.0/(3-2*A))+(A+3)*(A**2+3*A+2)*sp.arctanh(1.0/(2*A+3)))/3.0
 	Kernel_A = sp.concatenate([-sp.flipud(Kernel_A),sp.array([-X2,-X1,0.0,X1,X2]),Kernel_A])/sp.pi
-	## zero-padding the functions for fft
-	ImXExt_A = sp.concatenate([ImX_A[Nhalf:],sp.zeros(N+2),ImX_A[:Nhalf]])
+	## zero-padding the kernel for fft
 	KernelExt_A = sp.concatenate([Kernel_A[Nhalf:],sp.zeros(N+2),Kernel_A[:Nhalf]])
-	## performing the fft
-	ftReXExt_A = -fft(ImXExt_A)*fft(KernelExt_A)
-	ReXExt_A = sp.real(ifft(ftReXExt_A))
-	ReX_A = sp.concatenate([ReXExt_A[3*Nhalf+4:],ReXExt_A[:Nhalf+1]])
-	return ReX_A
+	ftKernelExt_A = FFTr(KernelExt_A).astype(ctype)
+	if fname != '':
+		## written to a temporary file first, KernelDir can be shared by several runs (as CacheWrite)
+		ftmp = fname+'.'+str(getpid())+'.tmp'
+		f = open(ftmp,'wb')
+		sp.save(f,ftKernelExt_A)
+		f.close()
+		rename(ftmp,fname)
+	KernelCache_D[key] = ftKernelExt_A
+	return ftKernelExt_A
+
+
+@Counted
+def KramersKronigFFT(ImX_A):
+	""" Hilbert transform used to calculate real part of a function from its imaginary part
+         uses piecewise cubic interpolated integral kernel of the Hilbert transform
+         assumes that Im X (\infty)=0, ImX_A can be a (phases,N) array """
+	## zero-padding the function and performing the fft
+	ftX_A = PadFFT(ImX_A)
+	ftX_A *= KramersKronigKernel(N,StorageTypes()[0])
+	sp.negative(ftX_A,out = ftX_A)
+	return UnpadIFFT(ftX_A)
+
+
+@Counted
+def KramersKronigFFT_ABS(ImX_A,ABSpos_L):
+	""" Hilbert transform of a function with delta peaks, -1j*Res*pi/dE spikes at ABSpos_L
+	    the spikes (above the mean of the neighbouring points) are removed, the rest is transformed
+	    by KramersKronigFFT and the real parts Res/(x-x_ABS) of the peaks are added analytically,
+	    zero at the peaks themselves
+	    ImX_A can be a (phases,N) array, then ABSpos_L is a list of positions for every row """
+	ImX2_A = sp.array(ImX_A,dtype = StorageTypes()[0]).reshape(-1,N)	## a copy
+	Pos_L = [ABSpos_L] if ImX_A.ndim == 1 else ABSpos_L
+	Res_L = []
+	for [X_A,ABSpos_A] in zip(ImX2_A,Pos_L):
+		Pos_A = sp.array(ABSpos_A,dtype = int)
+		Smooth_A = (X_A[Pos_A-1]+X_A[Pos_A+1])/2.0
+		Res_L.append(-(X_A[Pos_A]-Smooth_A)*dE/sp.pi)
+		X_A[Pos_A] = Smooth_A
+	ReX_A = KramersKronigFFT(ImX2_A)
+	for [X_A,ABSpos_A,Res_A] in zip(ReX_A,Pos_L,Res_L):
+		for [pos,Res] in zip(sp.array(ABSpos_A,dtype = int),Res_A):
+			Dist_A = dE*sp.arange(-pos,N-pos)
+			Dist_A[pos] = sp.inf
+			X_A += Res/Dist_A
+	return ReX_A.reshape(ImX_A.shape)
+
+
+def ComplexArray(Re_A,Im_A):
+	""" Re_A + 1j*Im_A without temporary arrays, in the storage type """
+	X_A = sp.empty(Re_A.shape,dtype = StorageTypes()[1])
+	X_A.real = Re_A
+	X_A.imag = Im_A
+	return X_A
 
 #####################################################################
 # calculation of the interacting Green function #####################
 
-def GreensFunction(n,mu,SEn_A,SEa_A,SEnStar_A,SEaStar_A,X_A,A):
-	""" Nambu Green's function and its determinant calculated on X_A interval
+def GreensFunction(n,mu,SEn_A,SEa_A,SEnStar_A,SEaStar_A,I,DetOnly = False):
+	""" Nambu Green's function and its determinant calculated on the slice I of En_A
+	    hybridizations are read from HybTable, the self-energies are full arrays
 	    ABS in gap are not included, must be calculated separately
-	    A = 'band' calculates determinant for band
-	    A = 'gap' calculates determinant for gap """
+	    DetOnly = True skips the Green functions and returns [None,None,Det_A] """
 	hfe = eps+U*(n-0.5)
-	if A == 'band':
-		[S_A,D_A] = [SFb(X_A), DFb(X_A)]
-	else: ## A == 'gap' 
-		[S_A,D_A] = [SFg(X_A), DFg(X_A)]
-	Detn_A =  (X_A*(1.0+S_A)-hfe-SEn_A)*(X_A*(1.0+S_A)+hfe-SEnStar_A)
-	Deta_A =  (D_A-U*mu-SEa_A)*(D_A-U*mu-SEaStar_A)
-	Det_A  =  Detn_A-Deta_A
-	GFn_A  =  (X_A*(1.0+S_A)+hfe-SEnStar_A)/Det_A
-	GFa_A  = -(D_A-U*mu-SEa_A)/Det_A
-	return [GFn_A,GFa_A,Det_A]
+	[S_A,D_A] = HybTable()
+	XS_A  =  En_A[I]*(1.0+S_A[I])
+	Np_A  =  XS_A+hfe-SEnStar_A[I]		## numerator of the normal GF
+	Na_A  =  D_A[I]-U*mu-SEa_A[I]		## numerator of the anomalous GF
+	Det_A =  (XS_A-hfe-SEn_A[I])*Np_A-Na_A*(D_A[I]-U*mu-SEaStar_A[I])
+	if DetOnly: return [None,None,Det_A]
+	return [Np_A/Det_A,-Na_A/Det_A,Det_A]
+
+
+def GapCubic(Y_A,i):
+	""" cubic through four points of Y_A (on the gap grid En_A[EdgePos1+1:EdgePos2])
+	    around the interval [i,i+1], polynomial in t = (x-x_i)/dE """
+	j = min(max(i-1,0),len(Y_A)-4)
+	return sp.poly1d(sp.polyfit(sp.arange(j-i,j-i+4),Y_A[j:j+4],3))
+
+
+def GapValue(Y_A,x):
+	""" value and energy derivative of Y_A at x in gap from the local cubic """
+	X0 = En_A[EdgePos1+1]
+	i = min(max(int(sp.floor((x-X0)/dE)),0),len(Y_A)-2)
+	P = GapCubic(Y_A,i)
+	t = (x-X0)/dE-i
+	return [P(t),P.deriv()(t)/dE]
+
+
+def GapRoots(Re_A,imax = None):
+	""" zeroes of Re_A on the gap grid starting at En_A[EdgePos1+1], sign changes are found
+	    by a scan up to the point imax (the whole array by default), every root is refined
+	    on the local cubic, which uses the whole array also at the end of the scan """
+	X0 = En_A[EdgePos1+1]
+	Scan_A = Re_A[:imax]
+	Roots_L = []
+	for i in sp.nonzero((Scan_A[:-1] < 0.0) != (Scan_A[1:] < 0.0))[0]:
+		P = GapCubic(Re_A,i)
+		if P(0.0)*P(1.0) < 0.0: t = brentq(P,0.0,1.0,xtol = 1e-14)
+		else:	## rounding in the fit at a very small value, linear interpolation
+			t = Re_A[i]/(Re_A[i]-Re_A[i+1])
+		Roots_L.append(X0+(i+t)*dE)
+	return Roots_L
 
 
 def FindABS(Det_A):
-	"""	determines ABS energies as zeroes of GF determinant """
-	DetG = InterpolatedUnivariateSpline(En_A[EdgePos1+1:EdgePos2],sp.real(Det_A[:]))
-	RootsG_A = DetG.roots()
-	NABS = len(RootsG_A)
+	"""	determines ABS energies as zeroes of GF determinant in gap, Det_A is on En_A[EdgePos1+1:EdgePos2]
+	    returns [ABS_A,Diff_A,ABSpos_A], Diff_A are the derivatives of the determinant at ABS
+	    at half-filling (Symmetric) only the lower half of the gap is searched, the real part
+	    of the determinant is even, the other ABS is the mirror image """
+	Re_A = sp.real(Det_A)
+	Roots_L = GapRoots(Re_A,Nhalf-EdgePos1) if Symmetric() else []
+	if len(Roots_L) == 1: Roots_L.append(-Roots_L[0])
+	else: Roots_L = GapRoots(Re_A)
+	NABS = len(Roots_L)
 	ABSpos_A = sp.zeros(2)
-	Diff_A = sp.zeros(2)
 	if NABS == 0:	
 		## assumes ABS states too close to gap edges
 		## this also happens when using brentq to calculate densities and
@@ -182,25 +411,25 @@ def FindABS(Det_A):
 		print("# - Warning: FindABS: no ABS found: Probably too close to band edges.")
 		ABS_A = sp.array([-Delta+2.0*dE,Delta-2.0*dE])
 		ABSpos_A = sp.array([EdgePos1+1,EdgePos2-1])
-		Diff_A = sp.array([DetG.derivatives(ABS_A[0])[1],DetG.derivatives(ABS_A[1])[1]])
 	elif NABS == 1: 
 		## ABS too close to each other?
-		print("# - Warning: FindABS: only one ABS found: {0: .6e}".format(RootsG_A[0]))
+		print("# - Warning: FindABS: only one ABS found: {0: .6e}".format(Roots_L[0]))
 		print("# -          Assuming they are too close to Fermi energy.")
 		print("# -          Using mirroring to get the other ABS, please check the result.")
-		ABS_A = [-sp.fabs(RootsG_A[0]),sp.fabs(RootsG_A[0])]
-		for i in range(2):
-			ABSpos_A[i] = FindInEnergies(ABS_A[i],En_A)
-			Diff_A[i] = DetG.derivatives(ABS_A[i])[1]
-	elif NABS == 2:	
+		ABS_A = sp.array([-sp.fabs(Roots_L[0]),sp.fabs(Roots_L[0])])
+	elif NABS == 2:
 		## two ABS states, ideal case
-		ABS_A = sp.copy(RootsG_A)
+		ABS_A = sp.array(Roots_L)
+	else:
+		## spurious sign changes of a noisy determinant, usually beyond the 0-pi transition
+		raise RuntimeError('# - Error: FindABS: {0: 3d} zeroes of the determinant.'.format(NABS))
+	if NABS > 0:	## searching the gap only is much faster than the whole En_A
 		for i in range(2):
-			ABSpos_A[i] = FindInEnergies(RootsG_A[i],En_A)
-			Diff_A[i] = DetG.derivatives(RootsG_A[i])[1]
+			ABSpos_A[i] = EdgePos1+1+FindInEnergies(ABS_A[i],En_A[EdgePos1+1:EdgePos2])
+	if Symmetric() and ABS_A[0] == -ABS_A[1]:
+		Diff_A = GapValue(Re_A,ABS_A[0])[1]*sp.array([1.0,-1.0])
 	else:
-		print("# - Error: FindABS: Too many zeroes of the determinant.")
-		exit()
+		Diff_A = sp.array([GapValue(Re_A,ABS_A[i])[1] for i in range(2)])
 	if sp.fabs(ABS_A[0]+ABS_A[1]) > 1e-6:
 		print("# - Warning: FindABS: positive and negative ABS energies don't match, diff = {0: .6e}"\
 		.format(sp.fabs(ABS_A[0]-ABS_A[1])))
@@ -216,63 +445,95 @@ def FillGreensFunction(n,mu,SEn_A,SEa_A):
 	""" calculating the interacting Green's function using the Dyson equation
 	    weights of ABS are calculated numerically from determinant, 
 	    real parts are recalculated using KK relations """
+	[GFn_A,GFa_A,Det_A,ABS_A,ABSpos_A,Res_A] = DysonGreensFunction(n,mu,SEn_A,SEa_A)
+	GreensFunctionKK(GFn_A,GFa_A,[ABSpos_A],[Res_A])
+	ctype = StorageTypes()[1]
+	return [GFn_A.astype(ctype,copy = False),GFa_A.astype(ctype,copy = False),Det_A,ABS_A,ABSpos_A,Res_A]
+
+
+def HoleSelfEnergies(SEn_A,SEa_A):
+	""" -conj(SEn(-w)) and conj(SEa(-w)), the self-energies themselves at half-filling (Symmetric) """
+	if Symmetric(): return [SEn_A,SEa_A]
+	## flipud is a view, conj the only copy
+	SEnStar_A = sp.conj(sp.flipud(SEn_A))
+	sp.negative(SEnStar_A,out = SEnStar_A)
+	SEaStar_A = sp.conj(sp.flipud(SEa_A))
+	return [SEnStar_A,SEaStar_A]
+
+
+def DysonGreensFunction(n,mu,SEn_A,SEa_A):
+	""" first part of FillGreensFunction: Green functions from the Dyson equation
+	    with the ABS residues in the imaginary parts, real parts are not yet from KK """
 	hfe = eps+U*(n-0.5)
-	SEnStar_A = -sp.flipud(sp.conj(SEn_A))	# hole self-energies
-	SEaStar_A =  sp.flipud(sp.conj(SEa_A))
-	## calculate GF separately in band and in gap regions
-	[GFn1_A,GFa1_A,Det1_A] = GreensFunction(n,mu,SEn_A[:EdgePos1],SEa_A[:EdgePos1],\
-		SEnStar_A[:EdgePos1],SEaStar_A[:EdgePos1],En_A[:EdgePos1],'band')
-	[GFn2_A,GFa2_A,Det2_A] = GreensFunction(n,mu,SEn_A[EdgePos1+1:EdgePos2],SEa_A[EdgePos1+1:EdgePos2],\
-		SEnStar_A[EdgePos1+1:EdgePos2],SEaStar_A[EdgePos1+1:EdgePos2],En_A[EdgePos1+1:EdgePos2],'gap')
-	[GFn3_A,GFa3_A,Det3_A] = GreensFunction(n,mu,SEn_A[EdgePos2+1:],SEa_A[EdgePos2+1:],\
-		SEnStar_A[EdgePos2+1:],SEaStar_A[EdgePos2+1:],En_A[EdgePos2+1:],'band')
-	Det_A = sp.concatenate([Det1_A,sp.zeros(1),Det2_A,sp.zeros(1),Det3_A])
+	[SEnStar_A,SEaStar_A] = HoleSelfEnergies(SEn_A,SEa_A)
+	## calculate GF separately in band and in gap regions, filled in place
+	[GFn_A,GFa_A,Det_A] = [sp.zeros(N,dtype = complex) for i in range(3)]
+	if Symmetric():	## lower half only, then the mirror images
+		for I in [slice(0,EdgePos1),slice(EdgePos1+1,Nhalf+1)]:
+			[GFn_A[I],GFa_A[I],Det_A[I]] = GreensFunction(n,mu,SEn_A,SEa_A,SEnStar_A,SEaStar_A,I)
+		GFn_A[Nhalf+1:] = -sp.conj(GFn_A[Nhalf-1::-1])
+		GFa_A[Nhalf+1:] =  sp.conj(GFa_A[Nhalf-1::-1])
+		Det_A[Nhalf+1:] =  sp.conj(Det_A[Nhalf-1::-1])
+	else:
+		for I in [slice(0,EdgePos1),slice(EdgePos1+1,EdgePos2),slice(EdgePos2+1,N)]:
+			[GFn_A[I],GFa_A[I],Det_A[I]] = GreensFunction(n,mu,SEn_A,SEa_A,SEnStar_A,SEaStar_A,I)
+	Det2_A = Det_A[EdgePos1+1:EdgePos2]
 	#WriteFile(Det_A,Det_A,0.0,'2nd_det')
-	## splines to determine the value of self-energy at ABS
-	SigmanStar = InterpolatedUnivariateSpline(En_A[EdgePos1+1:EdgePos2],sp.real(SEnStar_A[EdgePos1+1:EdgePos2]))
-	Sigmaa     = InterpolatedUnivariateSpline(En_A[EdgePos1+1:EdgePos2],sp.real(SEa_A[EdgePos1+1:EdgePos2]))
-	GFn_A = sp.concatenate([GFn1_A,sp.zeros(1),GFn2_A,sp.zeros(1),GFn3_A])
-	GFa_A = sp.concatenate([GFa1_A,sp.zeros(1),GFa2_A,sp.zeros(1),GFa3_A])
-	## find ABS energies
+	## find ABS energies, FindABS always returns two
 	[ABS_A,Diff_A,ABSpos_A] = FindABS(Det2_A)
-	## the code is not prepared for more than two ABS, so we stop here:
-	if len(ABS_A) !=2: 
-		print('# - Error: FillGreensFunction: more or less than two ABS states, exit.')
-		exit(1)
+	## local cubics to determine the value of self-energy at ABS
+	SigmanStar = lambda x: GapValue(sp.real(SEnStar_A[EdgePos1+1:EdgePos2]),x)[0]
+	Sigmaa     = lambda x: GapValue(sp.real(SEa_A[EdgePos1+1:EdgePos2]),x)[0]
 	## calculate the residues, add ABS to imaginary part of the Green function
 	Res_A = sp.zeros(4)	## [ResGn1,ResGn2,ResGa1,ResGa2]
 	for i in range(2):
 		Res_A[i] =  sp.real((ABS_A[i]*(1.0+SFg(ABS_A[i]))+hfe-SigmanStar(ABS_A[i]))/Diff_A[i])
 		Res_A[i+2] = -sp.real((DFg(ABS_A[i])-U*mu-Sigmaa(ABS_A[i]))/Diff_A[i])
-		GFn_A[int(ABSpos_A[i])] = -1.0j*Res_A[i]*sp.pi/dE
-		GFa_A[int(ABSpos_A[i])] = -1.0j*Res_A[i+2]*sp.pi/dE
-	## find real part from imaginary using KK relations
-	GFn_A = KramersKronigFFT(sp.imag(GFn_A))+1.0j*sp.imag(GFn_A)
-	GFa_A = KramersKronigFFT(sp.imag(GFa_A))+1.0j*sp.imag(GFa_A)
-	## correct residues to ABS frequencies, to avoid errors due to KK relations
+	PutResidues(GFn_A,GFa_A,ABSpos_A,Res_A)
+	return [GFn_A,GFa_A,Det_A,ABS_A,ABSpos_A,Res_A]
+
+
+def PutResidues(GFn_A,GFa_A,ABSpos_A,Res_A):
+	""" ABS as -1j*Res*pi/dE spikes in the Green functions, in place """
 	for i in range(2):
 		GFn_A[int(ABSpos_A[i])] = -1.0j*Res_A[i]*sp.pi/dE
 		GFa_A[int(ABSpos_A[i])] = -1.0j*Res_A[i+2]*sp.pi/dE
-	return [GFn_A,GFa_A,Det_A,ABS_A,ABSpos_A,Res_A]
 
 
+def GreensFunctionKK(GFn_A,GFa_A,ABSpos_L,Res_L):
+	""" second part of FillGreensFunction: real parts from KK relations, in place
+	    GFn_A and GFa_A are from DysonGreensFunction, length N or (phases,N) arrays
+	    ABSpos_L and Res_L are the lists of ABSpos_A and Res_A, one for every row """
+	## find real part from imaginary using KK relations, ABS subtracted if KKpoles is set
+	if Symmetric():	## Im Gn even, Im Ga odd, a single transform, Re Gn is its odd part
+		ImX_A = sp.imag(GFn_A)+sp.imag(GFa_A)
+		if KKpoles: ReX_A = KramersKronigFFT_ABS(ImX_A,ABSpos_L if GFn_A.ndim > 1 else ABSpos_L[0])
+		else:       ReX_A = KramersKronigFFT(ImX_A)
+		[GFa_A.real,GFn_A.real] = SplitParity(ReX_A)
+	elif KKpoles:
+		GFn_A.real = KramersKronigFFT_ABS(sp.imag(GFn_A),ABSpos_L if GFn_A.ndim > 1 else ABSpos_L[0])
+		GFa_A.real = KramersKronigFFT_ABS(sp.imag(GFa_A),ABSpos_L if GFa_A.ndim > 1 else ABSpos_L[0])
+	else:
+		GFn_A.real = KramersKronigFFT(sp.imag(GFn_A))
+		GFa_A.real = KramersKronigFFT(sp.imag(GFa_A))
+	## correct residues to ABS frequencies, to avoid errors due to KK relations
+	for [Xn_A,Xa_A,ABSpos_A,Res_A] in zip(GFn_A.reshape(-1,N),GFa_A.reshape(-1,N),ABSpos_L,Res_L):
+		PutResidues(Xn_A,Xa_A,ABSpos_A,Res_A)
+
+
+@Counted
 def MSumsInt(n,mu,SEn_A,SEa_A):
 	""" returns Matsubara sums used in calculating n and mu from interacting GF
 	    returns three sums, then n = M[1]/(1-U*M[0]), mu = -M[2]/(1-U*M[0])
 	    this approach is numerically more stable than integrating GF """
 	ed = eps-U/2.0
-	SEnStar_A = -sp.flipud(sp.conj(SEn_A))	# hole self-energies
-	SEaStar_A =  sp.flipud(sp.conj(SEa_A))
-	[GFn1_A,GFa1_A,Det1_A] = GreensFunction(n,mu,SEn_A[:EdgePos1],SEa_A[:EdgePos1],\
-		SEnStar_A[:EdgePos1],SEaStar_A[:EdgePos1],En_A[:EdgePos1],'band')
-	[GFn2_A,GFa2_A,Det2_A] = GreensFunction(n,mu,SEn_A[EdgePos1+1:EdgePos2],SEa_A[EdgePos1+1:EdgePos2],\
-		SEnStar_A[EdgePos1+1:EdgePos2],SEaStar_A[EdgePos1+1:EdgePos2],En_A[EdgePos1+1:EdgePos2],'gap')
-	[GFn3_A,GFa3_A,Det3_A] = GreensFunction(n,mu,SEn_A[EdgePos2+1:],SEa_A[EdgePos2+1:],\
-		SEnStar_A[EdgePos2+1:],SEaStar_A[EdgePos2+1:],En_A[EdgePos2+1:],'band')
+	[SEnStar_A,SEaStar_A] = HoleSelfEnergies(SEn_A,SEa_A)
+	## only the determinants in the lower band and in the gap are needed
+	Det1_A = GreensFunction(n,mu,SEn_A,SEa_A,SEnStar_A,SEaStar_A,slice(0,EdgePos1),True)[2]
+	Det2_A = GreensFunction(n,mu,SEn_A,SEa_A,SEnStar_A,SEaStar_A,slice(EdgePos1+1,EdgePos2),True)[2]
 	[ABS_A,Diff_A,ABSpos_A] = FindABS(Det2_A)
 	Band_A = En_A[:EdgePos1]
-	S_A = SFunctionBand(Band_A)
-	D_A = DeltaFunctionBand(Band_A)
+	[S_A,D_A] = [X_A[:EdgePos1] for X_A in HybTable()]
 	Int1_A = sp.imag(1.0/Det1_A)
 	Int2_A = sp.imag((Band_A*(1.0+S_A)+ed-SEnStar_A[:EdgePos1])/Det1_A)
 	Int3_A = sp.imag((D_A-SEa_A[:EdgePos1])/Det1_A)
@@ -282,18 +543,13 @@ def MSumsInt(n,mu,SEn_A,SEa_A):
 	Head1 = 0.5*dE*Int1_A[-1]
 	Head2 = 0.5*dE*Int2_A[-1]
 	Head3 = 0.5*dE*Int3_A[-1]
-	if len(ABS_A) == 2:
-		Swzero = SFunctionGap(ABS_A[0])
-		Dwzero = DeltaFunctionGap(ABS_A[0])
-		Res2 = ABS_A[0]*(1.0+Swzero)+ed-SEnStar_A[int(ABSpos_A[0])]
-		Res3 = Dwzero-SEa_A[int(ABSpos_A[0])]
-		MSum1R = -(trapz(Int1_A,Band_A)+Head1+Tail1)/sp.pi+1.0/Diff_A[0]
-		MSum2R = -(trapz(Int2_A,Band_A)+Head2+Tail2)/sp.pi+Res2/Diff_A[0]
-		MSum3R = -(trapz(Int3_A,Band_A)+Head3+Tail3)/sp.pi+Res3/Diff_A[0]
-	else:
-		print('# - Error: MSumsInt: more or less than two ABS states (NABS = {0: 2d})'\
-		.format(len(ABS_A)))
-		exit(1)
+	Swzero = SFunctionGap(ABS_A[0])
+	Dwzero = DeltaFunctionGap(ABS_A[0])
+	Res2 = ABS_A[0]*(1.0+Swzero)+ed-SEnStar_A[int(ABSpos_A[0])]
+	Res3 = Dwzero-SEa_A[int(ABSpos_A[0])]
+	MSum1R = -(trapz(Int1_A,Band_A)+Head1+Tail1)/sp.pi+1.0/Diff_A[0]
+	MSum2R = -(trapz(Int2_A,Band_A)+Head2+Tail2)/sp.pi+Res2/Diff_A[0]
+	MSum3R = -(trapz(Int3_A,Band_A)+Head3+Tail3)/sp.pi+Res3/Diff_A[0]
 	return sp.real_if_close([MSum1R,MSum2R,MSum3R])
 
 
@@ -304,10 +560,29 @@ def IntDOS(GFn_A):
 	return -trapz(sp.imag(GFn_A),En_A)/sp.pi + TailL + TailR
 
 
+## last results of MSumsInt, keys are (n,mu,id(SEn_A),id(SEa_A)) and the parameters
+MSumsCache_D = OrderedDict()
+MSumsCacheSize = 8
+
+def Densities(n,mu,SEn_A,SEa_A):
+	""" n and mu from a single evaluation of MSumsInt
+	    returns [n,mu,MSums_A], last MSumsCacheSize results are kept in MSumsCache_D """
+	key = (float(n),float(mu),id(SEn_A),id(SEa_A),U,eps,Phi,GammaL,GammaR,Delta) ## fixed_point sends arrays
+	if key in MSumsCache_D:
+		MSumsCache_D[key] = MSumsCache_D.pop(key)	## move to the end
+	else:
+		## self-energies are stored with the result so their id cannot be reused
+		MSumsCache_D[key] = [SEn_A,SEa_A,MSumsInt(n,mu,SEn_A,SEa_A)]
+		if len(MSumsCache_D) > MSumsCacheSize: MSumsCache_D.popitem(last = False)
+	MSums_A = MSumsCache_D[key][2]
+	n_new  = sp.real_if_close( MSums_A[1]/(1.0 - U*MSums_A[0]))
+	mu_new = sp.real_if_close(-MSums_A[2]/(1.0 - U*MSums_A[0]))
+	return [n_new,mu_new,MSums_A]
+
+
 def ElectronDensity(n,mu,SEn_A,SEa_A):
 	""" calculating n from Matsbara sums MSumsInt """
-	MSums_A = MSumsInt(n,mu,SEn_A,SEa_A)
-	n = sp.real_if_close(MSums_A[1]/(1.0 - U*MSums_A[0]))
+	n = Densities(n,mu,SEn_A,SEa_A)[0]
 	if sp.fabs(sp.imag(n)) > 1e-12:
 		print('# - Warning: ElectronDensity: non-zero imag. part of n: {0: .5e}'\
 		.format(float(sp.imag(n))))
@@ -316,14 +591,89 @@ def ElectronDensity(n,mu,SEn_A,SEa_A):
 
 def CooperPairDensity(n,mu,SEn_A,SEa_A):
 	""" calculating mu from Matsbara sums MSumsInt """
-	MSums_A = MSumsInt(n,mu,SEn_A,SEa_A)
-	mu =  sp.real_if_close(-MSums_A[2]/(1.0 - U*MSums_A[0]))
+	mu = Densities(n,mu,SEn_A,SEa_A)[1]
 	if sp.fabs(sp.imag(mu)) > 1e-12: 
 		print('# - Warning: CooperPairDensity: non-zero imag. part of mu: {0: .5e}'\
 		.format(float(sp.imag(mu))))
 	return sp.float64(sp.real(mu))
 
 
+def BrentqWarm(eqn,x0,xmin,xmax):
+	""" Brent's method on a narrow interval around x0 (continuation),
+	    the interval is widened up to (xmin,xmax) until eqn changes sign """
+	dx = WarmWidth
+	[a,b] = [max(x0-dx,xmin),min(x0+dx,xmax)]
+	while eqn(a)*eqn(b) > 0.0 and (a > xmin or b < xmax):
+		dx = 4.0*dx
+		[a,b] = [max(x0-dx,xmin),min(x0+dx,xmax)]
+	return brentq(eqn,a,b,xtol = ConvX)
+
+
+def StaticSelfEnergy(n,mu,SEn_A,SEa_A,Warm = False):
+	""" self-consistent static self-energy (densities n and mu) for fixed dynamic self-energy
+	    the dynamic part is not changed anymore,
+	    charge consistency is aquired via shift of the static part
+	    Warm = True: n and mu come from a nearby point, brentq searches around them """
+	if rootf in RootMethods_L: 
+		[n,mu,Success] = StaticSelfEnergy2D(n,mu,SEn_A,SEa_A)
+		if Success: return [n,mu]
+		print("# - Warning: StaticSelfEnergy: no convergence of the 2D solver, using Brent's method.")
+	if chat: 
+		if rootf == 'fixed_point': print("# - Using Steffensen's fixed point method")
+		else: print("# - Using Brent's method")
+	n_old = 1e5
+	mu_old = 1e5
+	k = 1
+	while any([sp.fabs(n-n_old)>ConvN,sp.fabs(mu-mu_old)>ConvN]):
+		n_old = n
+		mu_old = mu
+		if rootf != 'fixed_point':
+			if eps == 0.0: n = 0.5 ## half-filling
+			else: 
+				eqnN = lambda x: x - ElectronDensity(x,mu,SEn_A,SEa_A)
+				n = BrentqWarm(eqnN,n,0.0,1.0) if Warm else brentq(eqnN,0.0,1.0,xtol = ConvX)
+			eqnA = lambda x: x - CooperPairDensity(n,x,SEn_A,SEa_A)
+			## change upper and lower limits if needed
+			mu = BrentqWarm(eqnA,mu,MuMin,MuMax) if Warm else brentq(eqnA,MuMin,MuMax,xtol = ConvX)
+		else:
+			## half-filling
+			if eps == 0.0: n = 0.5 
+			else: 			
+				eqnN = lambda x: ElectronDensity(x,mu,SEn_A,SEa_A)
+				n = fixed_point(eqnN,n_old,xtol = ConvX)
+			eqnA = lambda x: CooperPairDensity(n,x,SEn_A,SEa_A)
+			mu = fixed_point(eqnA,mu_old,xtol = ConvX)
+		if chat: print('# - {0: 3d}:  n ={1: .5f}, mu ={2: .5f}'.format(k,n,mu))
+		k += 1
+	return [n,mu]
+
+
+## methods of scipy.optimize.root used for the joint solution for n and mu
+RootMethods_L = ['hybr','broyden1','anderson']
+
+def StaticSelfEnergy2D(n,mu,SEn_A,SEa_A):
+	""" static self-energy from joint solution of the coupled equations for n and mu
+	    using scipy.optimize.root with method rootf, n is fixed to 0.5 at half-filling
+	    returns [n,mu,success], prints the number of evaluations of MSumsInt """
+	Neval = [0]
+	def eqn(X_A):
+		Neval[0] += 1
+		[nx,mux] = [0.5,X_A[0]] if eps == 0.0 else X_A
+		[n_new,mu_new] = sp.real(Densities(nx,mux,SEn_A,SEa_A)[:2])
+		return sp.array([mux-mu_new]) if eps == 0.0 else sp.array([nx-n_new,mux-mu_new])
+	if chat: print("# - Using scipy.optimize.root, method "+rootf)
+	X0_A = sp.array([mu]) if eps == 0.0 else sp.array([n,mu])
+	try:
+		Sol = root(eqn,X0_A,method = rootf,tol = ConvX)
+		Success = Sol.success
+	except (ValueError,RuntimeError):
+		Success = False
+	if not Success: return [n,mu,False]
+	[n,mu] = [0.5,Sol.x[0]] if eps == 0.0 else Sol.x
+	if chat: print('# - {0: 3d} evaluations:  n ={1: .5f}, mu ={2: .5f}'.format(Neval[0],n,mu))
+	return [sp.float64(n),sp.float64(mu),True]
+
+
 def JosephsonCurrent(GFa_A,ResGa,wzero):
 	""" calculates the Josephson current separated into the band part and the gap (ABS) part """
 	PreFac = Delta*GammaTot*sp.sin(Phi/2.0)
@@ -332,46 +682,5 @@ def JosephsonCurrent(GFa_A,ResGa,wzero):
 	JCgap  = PreFac*ResGa/sp.sqrt(Delta**2-wzero**2)
 	return [JCband,JCgap]
 
-'''
-def KramersKronigFFT_ABS(ImX_A,ABSpos_A,Res_A):
-	"""  Hilbert transform used to calculate real part of a function from its imaginary part
-		uses piecewise cubic interpolated integral kernel of the Hilbert transform
-		assumes that Im X (\infty)=0 and there are delta-functions at ABSpos_A
-		the 1/x polar contributions can be added analytically 
-		leave ABSpos_A and Res_A empty if the function has no poles	"""
-	## removing poles from the function X
-	if len(ABSpos_A) > 0: 
-		for i in range(len(ABSpos_A)): ImX_A[int(ABSpos_A[i])] = 0.0
-	if N > 3e6: A = sp.arange(3,Nhalf+1,dtype='float64')	## be careful with the data type!!!
-	else:       A = sp.arange(3,Nhalf+1)  
-	#A = sp.arange(3,N+1,dtype='float64')
-	X1 = 4.0*sp.log(1.5)
-	X2 = 10.0*sp.log(4.0/3.0)-6.0*sp.log(1.5)
-	## filling the kernel	
-	if N > 3e6: Kernel_A = sp.zeros(Nhalf-2,dtype='float64')
-	else:       Kernel_A = sp.zeros(Nhalf-2)
-	#Kernel_A = sp.zeros(N-2,dtype='float64')
-	Kernel_A = (1-A**2)*((A-2)*sp.arctanh(1.0/(1-2*A))+(A+2)*sp.arctanh(1.0/(1+2*A)))\
-	+((A**3-6*A**2+11*A-6)*sp.arctanh(1.0/(3-2*A))+(A+3)*(A**2+3*A+2)*sp.arctanh(1.0/(2*A+3)))/3.0
-	Kernel_A = sp.concatenate([-sp.flipud(Kernel_A),sp.array([-X2,-X1,0.0,X1,X2]),Kernel_A])/sp.pi
-	## zero-padding the functions for fft
-	ImXExt_A = sp.concatenate([ImX_A[Nhalf:],sp.zeros(N+2),ImX_A[:Nhalf]])
-	KernelExt_A = sp.concatenate([Kernel_A[Nhalf:],sp.zeros(N+2),Kernel_A[:Nhalf]])
-	## performing the fft
-	ftReXExt_A = -fft(ImXExt_A)*fft(KernelExt_A)
-	ReXExt_A = sp.real(ifft(ftReXExt_A))
-	ReX_A = sp.concatenate([ReXExt_A[3*Nhalf+4:],ReXExt_A[:Nhalf+1]])
-	## adding back the 1/x part from the ABS
-	if len(ABSpos_A) > 0: 
-		if len(ABSpos_A) != 2:
-			print('# KramersKronigFFT: more than two ABS states, exit.')
-			exit(-1)
-		for i in range(len(ABSpos_A)):
-			if ABSpos_A[i] != -1: 
-				OneOverX = 1.0/(En_A-En_A[int(ABSpos_A[i])]+1e-10)
-				ReX_A = ReX_A + Res_A[i]*OneOverX
-	return ReX_A
-'''
-
 ## squadlib2.py end ##
 
@@ -0,0 +1,113 @@
+################################################################
+# SQUAD - superconducting quantum dot                          #
+# Copyright (C) 2012-2019  Vladislav Pokorny; pokornyv@fzu.cz  #
+# homepage: github.com/pokornyv/SQUAD                          #
+# squadprof.py - timing and call counts                        #
+# method described in                                          #
+#    Sci. Rep. 5, 8821 (2015).                                 #
+#    Phys. Rev. B 93, 024523 (2016).                           #
+################################################################
+
+from config_squad import *
+from collections import OrderedDict
+from functools import wraps
+import json
+try:
+	import resource
+except ImportError:	## not available on Windows
+	resource = None
+
+#############################
+##### List of functions: ####
+# Counted
+# ProfCount
+# ProfReset
+# ProfStage
+# PeakMemory
+# ProfRecord
+# ProfSummary
+# ProfWrite
+
+## Call counts and stage wall times of the current SquadSolver.Run.
+## Counting costs a dictionary update per call, the counted functions
+## are the expensive ones (MSumsInt, KramersKronigFFT, ...).
+
+Counts_D = OrderedDict()  ## number of calls and iterations
+Times_D  = OrderedDict()  ## wall time of stages and counted functions
+
+#####################################################################
+# counters ##########################################################
+
+def Counted(func):
+	""" decorator counting calls and total time of func """
+	name = func.__name__
+	@wraps(func)
+	def CountedFunc(*args,**kwargs):
+		t = time()
+		try:
+			return func(*args,**kwargs)
+		finally:
+			Counts_D[name] = Counts_D.get(name,0)+1
+			Times_D[name]  = Times_D.get(name,0.0)+time()-t
+	return CountedFunc
+
+
+def ProfCount(name,k = 1):
+	""" adds k to the counter name, e.g. the number of HF iterations """
+	Counts_D[name] = Counts_D.get(name,0)+k
+
+
+def ProfReset():
+	""" clears the counters before a new run """
+	Counts_D.clear()
+	Times_D.clear()
+
+
+def ProfStage(name,t):
+	""" records the wall time of a stage that started at time t """
+	Times_D['stage '+name] = time()-t
+
+
+def PeakMemory():
+	""" peak resident memory of the process in MB, None if unknown """
+	if resource is None: return None
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0	## kB on Linux
+
+#####################################################################
+# output ############################################################
+
+def ProfRecord(Params):
+	""" dictionary of the timings and counts of the last run """
+	Record = OrderedDict()
+	for name in ['U','Delta','GammaR','GammaL','eps','P']:
+		Record[name] = float(Params[name])
+	Record['N'] = int(N)
+	Record['stages']  = OrderedDict([(name[6:],Times_D[name]) for name in Times_D if name.startswith('stage ')])
+	Record['times']   = OrderedDict([(name,Times_D[name]) for name in Times_D if not name.startswith('stage ')])
+	Record['counts']  = OrderedDict(Counts_D)
+	Record['peak_MB'] = PeakMemory()
+	return Record
+
+
+def ProfSummary(Record):
+	""" prints the record as a comment block """
+	print('#\n# Timing summary:')
+	for name in Record['stages']:
+		print('# - stage {0: <12s} {1: 9.3f} s'.format(name,Record['stages'][name]))
+	for name in Record['counts']:
+		if name in Record['times']:
+			print('# - {0: <18s} {1: 6d} calls {2: 9.3f} s'.format(name,Record['counts'][name],Record['times'][name]))
+		else:
+			print('# - {0: <18s} {1: 6d}'.format(name,Record['counts'][name]))
+	if Record['peak_MB'] is not None:
+		print('# - peak memory {0: 10.1f} MB'.format(Record['peak_MB']))
+
+
+def ProfWrite(Record):
+	""" appends the record as a line of JSON to ProfFile """
+	f = open(ProfFile,'a')
+	f.write(json.dumps(Record)+'\n')
+	f.close()
+
+## squadprof.py end ##
+
@@ -0,0 +1,472 @@
+################################################################
+# SQUAD - superconducting quantum dot                          #
+# Copyright (C) 2012-2019  Vladislav Pokorny; pokornyv@fzu.cz  #
+# homepage: github.com/pokornyv/SQUAD                          #
+# squadsolver.py - reusable 2ndPT solver object                #
+# method described in                                          #
+#    Sci. Rep. 5, 8821 (2015).                                 #
+#    Phys. Rev. B 93, 024523 (2016).                           #
+################################################################
+
+from __future__ import print_function
+import config_squad
+import squadlib1
+import squadlib2
+import squadfft
+import squadcache
+import squadprof
+from squadlib2 import *
+from squadcache import CacheName,CacheNearest,CacheRead,CacheWrite,CheckpointKey,CheckpointRead,CheckpointWrite,StaticOptions
+from squadprof import ProfReset,ProfStage,ProfRecord,ProfSummary,ProfWrite
+
+#############################
+##### List of functions: ####
+# SquadSolver
+# WarmGuess
+# ResultHeader
+# ResultLine
+# Richardson
+# RefineOrder
+# RunRefined
+
+## names of the [params] and [IO] options that are copied to the libraries
+Options_L = ['rootf','ConvN','ConvX','ConvHF','MuMin','MuMax','ABSinit_val','HF_max_iter','HFmethod','HFgrid','HFpoints','offset_x',\
+'FFTbackend','FFTworkers','Precision','chat','Write_HFGF','Write_Bubble','Write_2ndSE','Write_2ndGF','Write_AC','EstepFiles','WriteFormat','KernelDir','WisdomFile',\
+'CacheDir','CacheSize','CacheArrays','CacheSeed','CheckpointDir','ProfFile','PhaseBatch','KKpoles','PHsymmetry','WarmWidth']
+
+## entries of the results dictionary returned by SquadSolver.Run
+ResultNames_L = ['nHF','muHF','wzeroHF','ResGaHF','IDin','ErrMsgHF','wzero','n','mu','n_final','mu_final',\
+'IDout','Res_A','ABS_A','ABSpos_A','SEnABS','SEaABS','JCband','JCgap','JC','Sigman_A','Sigmaa_A','GFn_A','GFa_A']
+
+class SquadSolver:
+	""" 2ndPT solver for a fixed energy grid
+	    Params: dictionary from PhysParams, Grid: dictionary from EnergyGrid
+	    Options: dictionary overriding the squad.in options (rootf, ConvN, ...)
+	    The library functions read the parameters from their module globals,
+	    the solver sets them before every call so that several solvers
+	    can be used in a single process without rebuilding the energy axis. """
+
+	def __init__(self,Params,Grid,Options = {}):
+		self.Grid = Grid
+		self.Options = dict([(opt,getattr(config_squad,opt)) for opt in Options_L])
+		self.Options.update(Options)
+		CheckChoices(self.Options)
+		self.Edges_D = {}  ## band edges for every Delta used so far
+		self.SetParams(Params)
+
+	def SetParams(self,Params):
+		""" change the physical parameters, energy axis is kept """
+		Delta = Params['Delta']
+		if Delta not in self.Edges_D:
+			self.Edges_D[Delta] = BandEdges(Delta,self.Grid)
+		self.Params = Params
+		self.Globals = {}
+		self.Globals.update(self.Grid)
+		self.Globals.update(self.Options)
+		self.Globals.update(Params)
+		[self.Globals['EdgePos1'],self.Globals['EdgePos2']] = self.Edges_D[Delta]
+
+	def Activate(self):
+		""" pushes parameters, grid and options to the library modules """
+		for mod in [config_squad,squadfft,squadcache,squadprof,squadlib1,squadlib2]:
+			mod.__dict__.update(self.Globals)
+
+	## wrappers of the library functions
+	def SolveHF(self,Guess = None):
+		self.Activate()
+		return squadlib1.SolveHF(Guess)
+
+	def SolveHFBatch(self,Params_L,Guess = None):
+		self.Activate()
+		return squadlib1.SolveHFBatch(Params_L,Guess)
+
+	def TwoParticleBubbles(self,GFn_A,GFa_A,wzero):
+		self.Activate()
+		return squadlib2.TwoParticleBubbles(GFn_A,GFa_A,wzero)
+
+	def SelfEnergy(self,GFn_A,GFa_A,ChiGamma_A):
+		self.Activate()
+		return squadlib2.SelfEnergy(GFn_A,GFa_A,ChiGamma_A)
+
+	def FillGreensFunction(self,n,mu,SEn_A,SEa_A):
+		self.Activate()
+		return squadlib2.FillGreensFunction(n,mu,SEn_A,SEa_A)
+
+	def JosephsonCurrent(self,GFa_A,ResGa,wzero):
+		self.Activate()
+		return squadlib2.JosephsonCurrent(GFa_A,ResGa,wzero)
+
+	## stages of the 2ndPT calculation
+	## each stage reads the State dictionary and returns a dictionary of new entries
+	def StageHF(self,State):
+		""" Hartree-Fock solution and HF Green function """
+		[U,ed,Guess] = [self.Params['U'],self.Params['ed'],State['Guess']]
+		[chat,En_A] = [self.Options['chat'],self.Grid['En_A']]
+		if chat: print('#\n# Calculating the Hartree-Fock solution:')
+		if Guess is not None:
+			[n,mu,wzero,ErrMsgHF] = SolveHF([Guess['nHF'],Guess['muHF'],Guess['wzeroHF']])
+			hfe = ed+U*n
+			wzero = AndreevEnergy(hfe,mu,wzero)
+		## HF ABS within dE of zero: the residues are ill-conditioned (AndreevEnergy) and depend
+		## on the starting point, the solution starts from ABSinit_val*Delta as without a guess
+		if Guess is None or sp.fabs(wzero) < self.Grid['dE']:
+			[n,mu,wzero,ErrMsgHF] = SolveHF()
+			hfe = ed+U*n					## Hartree-Fock energy level
+			wzero = AndreevEnergy(hfe,mu)		## HF ABS frequencies
+		[GFn_A,GFa_A,ABSposGF1,ABSposGF2] = FillGreenHF(hfe,mu,wzero)
+		if self.Options['Write_HFGF']: WriteFile(GFn_A,GFa_A,wzero,'HF_green')
+		[ResGnp1,ResGnh1,ResGa1] = GFresidues(hfe,mu,-wzero) ## HF residues at -w0
+		[ResGnp2,ResGnh2,ResGa2] = GFresidues(hfe,mu, wzero) ## HF residues at +w0
+		IDin = IntDOS(GFn_A)
+		if chat: print('# - Hartree-Fock solution: n ={0: .5f}, mu ={1: .5f}, E(ABS) ={2: .5f}, int(DoS) ={3: .5f}'\
+		.format(n,mu,wzero,IDin))
+		if chat: print('# - HF residues: Gn: [{0: .5f}, {1: .5f}], Ga: [{2: .5f}, {3: .5f}]'\
+		.format(ResGnp1,ResGnp2,ResGa1,-ResGa1))
+		return {'nHF': n, 'muHF': mu, 'wzeroHF': wzero, 'ErrMsgHF': ErrMsgHF, 'ResGaHF': ResGa1, 'IDin': IDin,\
+		'GFnHF_A': GFn_A, 'GFaHF_A': GFa_A}
+
+	def StageBubbles(self,State):
+		""" two-particle bubbles from HF Green function """
+		if self.Options['chat']: print('#\n# Calculating second-order PT solution:')
+		if self.Options['chat']: print('# - calculating two-particle bubbles...')
+		[Chin_A,Chia_A,ABSposChi1,ABSposChi2] = TwoParticleBubbles(State['GFnHF_A'],State['GFaHF_A'],State['wzeroHF'])
+		if self.Options['Write_Bubble']: WriteFile(Chin_A,Chia_A,self.Grid['En_A'][ABSposChi1],'HF_bubbles')
+		return {'Chin_A': Chin_A, 'Chia_A': Chia_A}
+
+	def StageSelfEnergy(self,State):
+		""" dynamic self-energy, solution of the Schwinger-Dyson equation """
+		## kernel of the Schwinger-Dyson equation (without the static HF parts U*n and U*mu)
+		## the bubbles are not needed after this, released to save memory
+		ChiGamma_A = self.Params['U']**2*(State.pop('Chin_A')+State.pop('Chia_A'))
+		if self.Options['chat']: print('# - calculating dynamic self-energy...')
+		[Sigman_A,Sigmaa_A] = SelfEnergy(State['GFnHF_A'],State['GFaHF_A'],ChiGamma_A)
+		if self.Options['Write_2ndSE']: WriteFile(Sigman_A,Sigmaa_A,0.0,'2nd_SE')
+		return {'Sigman_A': Sigman_A, 'Sigmaa_A': Sigmaa_A}
+
+	def StageStatic(self,State):
+		""" static self-energy, densities n and mu consistent with the 2ndPT Green function """
+		[Sigman_A,Sigmaa_A,Guess] = [State['Sigman_A'],State['Sigmaa_A'],State['Guess']]
+		## initial guess for the static part of self-energy ############
+		## not used if the HF ABS is within dE of zero, see StageHF
+		if Guess is not None and sp.fabs(State['wzeroHF']) < self.Grid['dE']: Guess = None
+		if Guess is None:
+			n  = ElectronDensity(State['nHF'],State['muHF'],Sigman_A,Sigmaa_A)
+			mu = CooperPairDensity(n,State['muHF'],Sigman_A,Sigmaa_A)
+		else:
+			[n,mu] = [Guess['n'],Guess['mu']]
+		if self.Options['chat']: print('#\n# Correcting the static self-energy:')
+		[n,mu] = StaticSelfEnergy(n,mu,Sigman_A,Sigmaa_A,Guess is not None)
+		return {'n': n, 'mu': mu, 'StaticOptions': StaticOptions(self.Globals)}
+
+	def StageFinal(self,State,GF_L = None):
+		""" interacting Green function, residues and the Josephson current
+		    GF_L is the output of FillGreensFunction if it is already calculated (RunPhases) """
+		[n,mu,Sigman_A,Sigmaa_A] = [State['n'],State['mu'],State['Sigman_A'],State['Sigmaa_A']]
+		[chat,ResGa1] = [self.Options['chat'],State['ResGaHF']]
+		if chat: print('#\n# Calculating the interacting Green function...')
+		if GF_L is None: GF_L = FillGreensFunction(n,mu,Sigman_A,Sigmaa_A)
+		[GFn_A,GFa_A,Det_A,ABS_A,ABSpos_A,Res_A] = GF_L
+		wzeroInt = ABS_A[1] ## ABS energy
+		if self.Options['Write_2ndGF']: WriteFile(GFn_A,GFa_A,wzeroInt,'2nd_green')
+		## densities ##########################
+		n_final  = ElectronDensity(n,mu,Sigman_A,Sigmaa_A)
+		mu_final = CooperPairDensity(n,mu,Sigman_A,Sigmaa_A)
+		IDout = IntDOS(GFn_A)
+		## selfenergies at ABS ################
+		SEnABS = sp.real(Sigman_A[int(ABSpos_A[0])])
+		SEaABS = sp.real(Sigmaa_A[int(ABSpos_A[0])])
+		## Josephson current ##################
+		JC_A = JosephsonCurrent(GFa_A,Res_A[2],wzeroInt)
+		JC = JC_A[0]+JC_A[1]
+		if chat:
+			print('# - final densities: n ={0: .5f}, mu ={1: .5f}'.format(n_final,mu_final))
+			print('# - 2ndPT Andreev energy: E(ABS) = {0: .5f}, int(DoS) = {1: .5f}'\
+			.format(sp.fabs(wzeroInt),IDout))
+			print('# - 2ndPT residues: Gn: [{0: .5f}, {1: .5f}], Ga: [{2: .5f}, {3: .5f}]'\
+			.format(Res_A[0],Res_A[1],Res_A[2],Res_A[3]))
+			if sp.sign(Res_A[2]*ResGa1) < 0.0:
+				print('# Warning: Residue of anomalous function changes sign, {0: .5f} -> {1: .5f} (false pi-phase?)'\
+				.format(ResGa1,Res_A[2]))
+			if sp.fabs(Res_A[0]-Res_A[1]) > 1e-3 and self.Params['eps'] == 0.0:
+				print("# Warning: Residues of normal GF at ABS don't match.")
+			print('# - self-energies at ABS: SEn = {0: .5f}, SEa = {1: .5f}'\
+			.format(SEnABS,SEaABS))
+			print('# - Josephson current: band: {0: .5f}, gap: {1: .5f}, total: {2: .5f}'\
+			.format(JC_A[0],JC_A[1],JC))
+		return {'wzero': wzeroInt, 'n_final': n_final, 'mu_final': mu_final, 'IDout': IDout,\
+		'Res_A': Res_A, 'ABS_A': ABS_A, 'ABSpos_A': ABSpos_A, 'SEnABS': SEnABS, 'SEaABS': SEaABS,\
+		'JCband': JC_A[0], 'JCgap': JC_A[1], 'JC': JC, 'GFn_A': GFn_A, 'GFa_A': GFa_A}
+
+	def RunStage(self,name,Stage,State,Resume):
+		""" runs a stage and updates State, with CheckpointDir set the stage output is written
+		    to a checkpoint and, if Resume, read from an existing one instead of calculated """
+		if self.Options['CheckpointDir'] == '':
+			State.update(Stage(State))
+			return
+		key = CheckpointKey(self.Globals)
+		Stage_D = CheckpointRead(key,name) if Resume else None
+		## static stage depends on the root-finding options
+		if Stage_D is not None and name == 'static' and Stage_D['StaticOptions'] != StaticOptions(self.Globals):
+			Stage_D = None
+		if Stage_D is None:
+			Stage_D = Stage(State)
+			CheckpointWrite(key,name,Stage_D)
+		elif self.Options['chat']: print('#\n# Stage '+name+' read from checkpoint '+key)
+		State.update(Stage_D)
+
+	def Run(self,Params = None,Guess = None,Resume = False):
+		""" full 2ndPT calculation, returns a dictionary of results
+		    Guess: results dictionary of a nearby point, used as a starting point
+		    of the HF iterations and of the static self-energy (continuation)
+		    the dynamic self-energy is not iterated, it needs no guess
+		    if CacheDir is set, results are read from and written to the cache (squadcache.py),
+		    the cached results contain the arrays only if CacheArrays is set, without Guess
+		    and with CacheSeed > 0 a nearby cached point is used (CacheNearest)
+		    if CheckpointDir is set, every stage is written to a checkpoint,
+		    Resume = True skips the stages that are already there
+		    timings and call counts are stored in self.Prof, printed if chat is set
+		    and appended to ProfFile if set """
+		if Params is not None: self.SetParams(Params)
+		ProfReset()
+		squadlib2.MSumsCache_D.clear()	## do not keep self-energies of previous points
+		self.Activate()
+		[U,En_A,dE,N] = [self.Params['U'],self.Grid['En_A'],self.Grid['dE'],self.Grid['N']]
+		chat = self.Options['chat']
+		if self.Options['CacheDir'] != '':
+			key = CacheName(self.Globals)
+			Results = CacheRead(key)
+			if Results is not None:
+				if chat: print('# - results read from cache, key '+key)
+				return Results
+			if Guess is None:
+				Guess = CacheNearest(self.Globals)
+				if chat and Guess is not None: print('# - starting from the nearest cached point')
+		Guess = WarmGuess(Guess,dE)
+		if chat:
+			print('# U ={0: .3f}, Delta ={1: .3f}, GammaR ={2: .3f}, GammaL ={3: .3f}, eps ={4: .3f}, Phi/pi ={5: .3f}'\
+			.format(U,self.Params['Delta'],self.Params['GammaR'],self.Params['GammaL'],self.Params['eps'],self.Params['P']))
+			print('# Kondo temperature (from Bethe ansatz): {0: .5e}'.format(KondoTemperature()))
+			print('# energy axis: [{0: .5f} ..{1: .5f}], step ={2: .5f}, length ={3: 3d}'\
+			.format(En_A[0],En_A[-1],dE,N))
+		State = {'Guess': Guess}
+		for [name,Stage] in [['HF',self.StageHF],['bubbles',self.StageBubbles],\
+		['selfenergy',self.StageSelfEnergy],['static',self.StageStatic]]:
+			t = time()
+			self.RunStage(name,Stage,State,Resume)
+			ProfStage(name,t)
+			## HF Green function and bubbles are not needed after the self-energy
+			if name == 'selfenergy':
+				for Xname in ['GFnHF_A','GFaHF_A','Chin_A','Chia_A']: State.pop(Xname,None)
+		t = time()
+		State.update(self.StageFinal(State))
+		ProfStage('final',t)
+		Results = dict([(name,State[name]) for name in ResultNames_L])
+		if self.Options['CacheDir'] != '': CacheWrite(key,Results)
+		self.Prof = ProfRecord(self.Params)
+		if chat: ProfSummary(self.Prof)
+		if self.Options['ProfFile'] != '': ProfWrite(self.Prof)
+		return Results
+
+	def RunPhases(self,Params_L,Guess = None,Warm = False):
+		""" 2ndPT calculation for parameter sets that differ only in the phase P (current-phase relation)
+		    returns the list of results dictionaries without the arrays, None for points that failed
+		    the points are solved in passes of PhaseBatch phases, see RunBatch
+		    Guess: results of a nearby point, used as in Run by every point or,
+		    if Warm = True, only by the first one, the others start from the previous point
+		    if CacheDir is set, the cache is used as in Run, checkpoints are not written """
+		for name in ['U','Delta','GammaR','GammaL','eps']:
+			if any([Params[name] != Params_L[0][name] for Params in Params_L]):
+				raise ValueError('# RunPhases: Error: the points differ in '+name+', only P can change.')
+		nb = max(self.Options['PhaseBatch'],1)
+		Results_L = []
+		for i in range(0,len(Params_L),nb):
+			Results_L += self.RunBatch(Params_L[i:i+nb],Guess,Warm)
+			if Warm and Results_L[-1] is not None: Guess = Results_L[-1]
+		return Results_L
+
+	def RunBatch(self,Params_L,Guess,Warm):
+		""" one pass of RunPhases: the HF solution and the static self-energy are solved point by point,
+		    the bubbles, dynamic self-energies and the KK transforms of the interacting Green functions
+		    for all phases at once on (phases,N) arrays, only the energy axis is shared by the phases """
+		ProfReset()
+		[chat,N] = [self.Options['chat'],self.Grid['N']]
+		[Results_L,States_L,Keys_L] = [[None]*len(Params_L) for k in range(3)]
+		## cached points, HF solutions point by point ###############
+		t = time()
+		Prev = Guess
+		for i in range(len(Params_L)):
+			self.SetParams(Params_L[i])
+			self.Activate()
+			if self.Options['CacheDir'] != '':
+				Keys_L[i] = CacheName(self.Globals)
+				Results_L[i] = CacheRead(Keys_L[i])
+				if Results_L[i] is not None:
+					if Warm: Prev = Results_L[i]
+					continue
+			Seed = Prev if Prev is not None or self.Options['CacheDir'] == '' else CacheNearest(self.Globals)
+			Seed = WarmGuess(Seed,self.Grid['dE'])
+			try:
+				States_L[i] = {'Guess': Seed}
+				States_L[i].update(self.StageHF(States_L[i]))
+				if Warm: Prev = States_L[i]
+			except (RuntimeError,ValueError,SystemExit):
+				States_L[i] = None
+		Act_L = [i for i in range(len(Params_L)) if States_L[i] is not None]
+		if len(Act_L) == 0: return Results_L
+		ctype = StorageTypes()[1]
+		[GFn_A,GFa_A] = [sp.empty((len(Act_L),N),dtype = ctype) for k in range(2)]
+		for [k,i] in enumerate(Act_L):
+			[GFn_A[k],GFa_A[k]] = [States_L[i].pop('GFnHF_A'),States_L[i].pop('GFaHF_A')]
+		ProfStage('HF',t)
+		## bubbles and dynamic self-energies of all phases ##########
+		t = time()
+		if chat: print('#\n# Calculating bubbles and dynamic self-energies for {0: 3d} phases...'.format(len(Act_L)))
+		[ChiGamma_A,Chia_A] = Bubbles(GFn_A,GFa_A,[BubblePoles(States_L[i]['wzeroHF']) for i in Act_L])
+		ProfStage('bubbles',t)
+		t = time()
+		ChiGamma_A += Chia_A
+		ChiGamma_A *= self.Params['U']**2
+		del Chia_A
+		[Sigman_A,Sigmaa_A] = SelfEnergy(GFn_A,GFa_A,ChiGamma_A)
+		del GFn_A,GFa_A,ChiGamma_A
+		ProfStage('selfenergy',t)
+		## static self-energies point by point ######################
+		t = time()
+		Prev = Guess
+		for [k,i] in enumerate(Act_L):
+			self.SetParams(Params_L[i])
+			self.Activate()
+			squadlib2.MSumsCache_D.clear()
+			if Warm and i > 0 and Results_L[i-1] is not None: Prev = Results_L[i-1]
+			Seed = WarmGuess(Prev,self.Grid['dE']) if Prev is not None else States_L[i]['Guess']	## cached point from the HF pass
+			States_L[i].update({'Sigman_A': Sigman_A[k], 'Sigmaa_A': Sigmaa_A[k], 'Guess': Seed})
+			try:
+				States_L[i].update(self.StageStatic(States_L[i]))
+				if Warm: Prev = States_L[i]
+			except (RuntimeError,ValueError,SystemExit):
+				States_L[i] = None
+		ProfStage('static',t)
+		## interacting Green functions, KK transforms of all phases ##
+		t = time()
+		Act_L = [i for i in Act_L if States_L[i] is not None]
+		[GFn_A,GFa_A] = [sp.empty((len(Act_L),N),dtype = complex) for k in range(2)]
+		ABS_L = []	## [ABS_A,ABSpos_A,Res_A] of every phase
+		for [k,i] in enumerate(Act_L):
+			self.SetParams(Params_L[i])
+			self.Activate()
+			[GFn_A[k],GFa_A[k],Det_A,ABS_A,ABSpos_A,Res_A] = \
+			DysonGreensFunction(States_L[i]['n'],States_L[i]['mu'],States_L[i]['Sigman_A'],States_L[i]['Sigmaa_A'])
+			ABS_L.append([ABS_A,ABSpos_A,Res_A])
+		GreensFunctionKK(GFn_A,GFa_A,[X_L[1] for X_L in ABS_L],[X_L[2] for X_L in ABS_L])
+		for [k,i] in enumerate(Act_L):
+			self.SetParams(Params_L[i])
+			self.Activate()
+			try:
+				States_L[i].update(self.StageFinal(States_L[i],[GFn_A[k].astype(ctype,copy = False),\
+				GFa_A[k].astype(ctype,copy = False),None]+ABS_L[k]))
+			except (RuntimeError,ValueError,SystemExit):
+				continue
+			Results = dict([(name,States_L[i][name]) for name in ResultNames_L])
+			if self.Options['CacheDir'] != '': CacheWrite(Keys_L[i],Results)
+			## rows of the batched arrays are not returned, they would keep the whole batch in memory
+			Results_L[i] = dict([(name,Results[name]) for name in ResultNames_L\
+			if not name.endswith('_A') or name in ['Res_A','ABS_A','ABSpos_A']])
+		ProfStage('final',t)
+		self.Prof = ProfRecord(self.Params)
+		if chat: ProfSummary(self.Prof)
+		if self.Options['ProfFile'] != '': ProfWrite(self.Prof)
+		return Results_L
+
+#####################################################################
+# continuation ######################################################
+
+def WarmGuess(Guess,dE):
+	""" Guess if it can be used as the starting point of a nearby point, None if its HF solution
+	    failed or its HF or 2ndPT ABS is within dE of zero, the residues are ill-conditioned
+	    there (AndreevEnergy) and the continuation can flip the sign of the current """
+	if Guess is None or Guess['ErrMsgHF'] != 0: return None
+	if min([sp.fabs(Guess[name]) for name in ['wzeroHF','wzero'] if name in Guess]) < dE: return None
+	return Guess
+
+#####################################################################
+# formatting the results ############################################
+
+def ResultHeader():
+	""" header of the results line """
+	return '# U     Delta   GammaR  GammaL  eps     Phi/pi  wABS'+' '*12+'n'+' '*15+'mu'\
+	+' '*14+'ResGn1'+' '*10+'ResGn2'+' '*10+'ResGa1'+' '*10+'JC'
+
+
+def ResultLine(Params,Results):
+	""" tab-separated line with parameters and results as printed by secondPT.py """
+	Res_A = Results['Res_A']
+	return '{0: .3f}\t{1: .3f}\t{2: .3f}\t{3: .3f}\t{4: .3f}\t{5: .3f}\t{6: .5f}\
+\t{7: .5f}\t{8: .5f}\t{9: .5f}\t{10: .5f}\t{11: .5f}\t{12: .5f}'\
+	.format(Params['U'],Params['Delta'],Params['GammaR'],Params['GammaL'],Params['eps'],Params['P']\
+	,Results['wzero'],Results['n'],Results['mu'],Res_A[0],Res_A[1],Res_A[2],Results['JC'])
+
+#####################################################################
+# coarse-to-fine refinement #########################################
+
+## At fixed dE the results converge with the cutoff Emax = dE*2^(M-1), wABS as Emax^-2,
+## i.e., every increase of M by one reduces the difference of subsequent levels by ~4.
+## n, mu and JC show no regular order (ratios of subsequent differences from -15 to 227),
+## the order is therefore estimated from the last three levels for every result and
+## the result is extrapolated only if the order is within OrderRange.
+
+## extrapolated results
+Refine_L = ['wzero','n','mu','JC']
+OrderRange = [1.0,4.0]
+
+def Richardson(Xc,Xf,Order = 2.0):
+	""" extrapolation from the cutoffs Emax (Xc) and 2*Emax (Xf), error ~ Emax^-Order """
+	return Xf+(Xf-Xc)/(2.0**Order-1.0)
+
+
+def RefineOrder(X0,Xc,Xf):
+	""" order of convergence from the cutoffs Emax/2, Emax and 2*Emax,
+	    None if the differences change sign or the order is outside OrderRange """
+	[D0,D1] = [Xc-X0,Xf-Xc]
+	if D0*D1 <= 0.0: return None
+	Order = sp.log2(D0/D1)
+	return Order if OrderRange[0] <= Order <= OrderRange[1] else None
+
+
+def RunRefined(Params,M,dE,Options = {},Levels = 3,Tol = 0.0):
+	""" 2ndPT on energy axes M-Levels+1,...,M at fixed dE, each level starts from the previous solution
+	    from three levels on, every result is extrapolated from the last two levels with the order
+	    estimated by RefineOrder, the error estimate is the Richardson correction or the change
+	    of the extrapolated value from the previous level if larger. Results without a sane order (and all results
+	    of two levels) are those of the finest level, the error estimate is the last difference
+	    if Tol > 0, stops at the first level where all error estimates are below Tol
+	    returns [Results_L,Extrap_D,Error_D,Order_D], Results_L are the results of the levels
+	    with the key 'M' added, only the last one contains the arrays, Order_D contains
+	    the orders used, None for the results that are not extrapolated """
+	[Results_L,Extrap_L,Orders_L] = [[],[],[]]
+	[Extrap_D,Error_D,Order_D] = [None,None,None]
+	for m in range(M-Levels+1,M+1):
+		Solver = SquadSolver(Params,EnergyGrid(m,dE),Options)
+		Guess = Results_L[-1] if len(Results_L) > 0 else None
+		Results_L.append(Solver.Run(Guess = Guess))
+		Results_L[-1]['M'] = m
+		if len(Results_L) > 1:
+			for name in [name for name in Results_L[-2] if name.endswith('_A') and name not in ['Res_A','ABS_A','ABSpos_A']]:
+				del Results_L[-2][name]
+			[Rc,Rf] = Results_L[-2:]
+			Orders_L.append(Order_D)
+			Order_D = dict([(name,None if len(Results_L) < 3 else RefineOrder(Results_L[-3][name],Rc[name],Rf[name]))\
+			for name in Refine_L])
+			Extrap_L.append(dict([(name,Rf[name] if Order_D[name] is None else Richardson(Rc[name],Rf[name],Order_D[name]))\
+			for name in Refine_L]))
+			Extrap_D = Extrap_L[-1]
+			Error_D = dict([(name,sp.fabs(Extrap_D[name]-Rf[name]) if Order_D[name] is not None else sp.fabs(Rf[name]-Rc[name]))\
+			for name in Refine_L])
+			## change of the extrapolated value, if the previous level was extrapolated too
+			for name in [name for name in Refine_L if Order_D[name] is not None and Orders_L[-1] is not None\
+			and Orders_L[-1][name] is not None]:
+				Error_D[name] = max(Error_D[name],sp.fabs(Extrap_D[name]-Extrap_L[-2][name]))
+			if Tol > 0.0 and max(Error_D.values()) < Tol: break
+	return [Results_L,Extrap_D,Error_D,Order_D]
+
+## squadsolver.py end ##
+
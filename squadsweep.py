@@ -0,0 +1,140 @@
+################################################################
+# SQUAD - superconducting quantum dot                          #
+# Copyright (C) 2012-2019  Vladislav Pokorny; pokornyv@fzu.cz  #
+# homepage: github.com/pokornyv/SQUAD                          #
+# squadsweep.py - parallel phase sweep                         #
+# method described in                                          #
+#    Sci. Rep. 5, 8821 (2015).                                 #
+#    Phys. Rev. B 93, 024523 (2016).                           #
+################################################################
+
+## usage: python squadsweep.py [--P Pmin:Pmax:NP] [--np NP] [--warm] [--batch] [-o file] <U> <Delta> <GammaR> <a> <eps>
+## calculates the 2ndPT solution for NP phases P = Phi/pi in [Pmin,Pmax]
+## the points are distributed over a pool of processes, the energy axis and
+## the Kramers-Kronig kernel are calculated once before the pool is forked,
+## the solver is passed to the workers by the pool initializer (SweepInit),
+## so that they do not depend on the globals of __main__ (spawn start method)
+## --warm: every process gets a contiguous block of phases and solves it
+## sequentially, each point starting from the solution of the previous one
+## --batch: every process gets a contiguous block of phases and solves it by
+## SquadSolver.RunPhases, PhaseBatch phases at once on (phases,N) arrays
+
+from squadsolver import *
+from multiprocessing import Pool,cpu_count
+from argparse import ArgumentParser
+
+#############################
+##### List of functions: ####
+# ParseRange
+# SweepInit
+# SweepPoint
+# SweepBlock
+# SweepPhases
+
+def ParseRange(s):
+	""" reads the range Pmin:Pmax:NP or a single value """
+	R_L = s.split(':')
+	if len(R_L) == 1: return sp.array([float(R_L[0])])
+	return sp.linspace(float(R_L[0]),float(R_L[1]),int(R_L[2]))
+
+
+## solver and continuation switch of the worker process, set by SweepInit
+Worker = None
+WarmPhases = False
+
+def SweepInit(Solver,Warm):
+	""" pool initializer, sets the solver of the worker process and the --warm switch
+	    the kernel is taken from the cache if the process was forked """
+	global Worker,WarmPhases
+	[Worker,WarmPhases] = [Solver,Warm]
+	Worker.Activate()
+	KramersKronigKernel(Worker.Grid['N'],StorageTypes()[0])
+
+
+def SweepPoint(Params):
+	""" calculates one point of the sweep in a worker process
+	    returns the results line or a comment line with the error """
+	try:
+		return ResultLine(Params,Worker.Run(Params))
+	except (RuntimeError,ValueError,SystemExit) as err:
+		return '# P = {0: .5f}: failed ({1})'.format(Params['P'],err)
+
+
+def SweepBlock(Params_L):
+	""" calculates a block of points in a worker process using continuation
+	    returns the list of results lines """
+	Lines_L = []
+	Guess = None
+	for Params in Params_L:
+		try:
+			Results = Worker.Run(Params,Guess)
+			Lines_L.append(ResultLine(Params,Results))
+			Guess = Results
+		except (RuntimeError,ValueError,SystemExit) as err:
+			Lines_L.append('# P = {0: .5f}: failed ({1})'.format(Params['P'],err))
+			Guess = None
+	return Lines_L
+
+
+def SweepPhases(Params_L):
+	""" calculates a block of points in a worker process by the batched solver
+	    returns the list of results lines """
+	try:
+		Results_L = Worker.RunPhases(Params_L,Warm = WarmPhases)
+	except (RuntimeError,ValueError,SystemExit) as err:
+		return ['# P = {0: .5f}: failed ({1})'.format(Params['P'],err) for Params in Params_L]
+	return [ResultLine(Params,Results) if Results is not None else '# P = {0: .5f}: failed'.format(Params['P'])\
+	for [Params,Results] in zip(Params_L,Results_L)]
+
+
+if __name__ == '__main__':
+	t = time()
+	parser = ArgumentParser(description='parallel phase sweep of the 2ndPT solution')
+	parser.add_argument('--P',default='0:0.999:50',help='range of P = Phi/pi as Pmin:Pmax:NP')
+	parser.add_argument('--np',type=int,default=cpu_count(),help='number of processes')
+	parser.add_argument('--warm',action='store_true',help='continuation within blocks of phases')
+	parser.add_argument('--batch',action='store_true',help='blocks of phases solved on (phases,N) arrays')
+	parser.add_argument('-o',default='sweep.dat',help='output file')
+	parser.add_argument('pars',type=float,nargs=5,help='U Delta GammaR a eps')
+	args = parser.parse_args()
+	[U,Delta,GammaR,a,eps] = args.pars
+
+	if cfile not in listdir('.'):
+		print('- Parameter file '+cfile+' missing. Exit.')
+		exit(1)
+
+	## no output from the workers, they would overwrite each other
+	Options = {'chat': False, 'Write_HFGF': 0, 'Write_Bubble': 0, 'Write_2ndSE': 0, 'Write_2ndGF': 0}
+	try:
+		Params_L = [PhysParams(U,Delta,GammaR,a*GammaR,eps,P) for P in ParseRange(args.P)]
+		Solver = SquadSolver(Params_L[0],EnergyGrid(M,dE),Options)
+	except ValueError as err:
+		print(err)
+		exit(1)
+	## shared by the forked workers
+	Solver.Activate()
+	KramersKronigKernel(Solver.Grid['N'],StorageTypes()[0])
+
+	if chat: print('# squadsweep: {0: 3d} points on {1: 3d} processes, output to {2:s}'\
+	.format(len(Params_L),args.np,args.o))
+	f = open(args.o,'w')
+	f.write(ResultHeader()+'\n')
+	pool = Pool(args.np,initializer = SweepInit,initargs = (Solver,args.warm))
+	## lines are written as points (blocks) finish, not ordered in P
+	if args.warm or args.batch:
+		Blocks_L = [[Params_L[i] for i in I_A] for I_A in sp.array_split(sp.arange(len(Params_L)),args.np) if len(I_A) > 0]
+		Results_I = pool.imap_unordered(SweepPhases if args.batch else SweepBlock,Blocks_L)
+	else:
+		Results_I = ([line] for line in pool.imap_unordered(SweepPoint,Params_L))
+	for Lines_L in Results_I:
+		for line in Lines_L:
+			f.write(line+'\n')
+			if chat: print(line)
+		f.flush()
+	pool.close()
+	pool.join()
+	f.close()
+	if chat: print('# '+argv[0]+' DONE after {0: .2f} seconds.'.format(time()-t))
+
+## squadsweep.py end ##
+
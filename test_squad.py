@@ -0,0 +1,85 @@
+################################################################
+# SQUAD - superconducting quantum dot                          #
+# Copyright (C) 2012-2019  Vladislav Pokorny; pokornyv@fzu.cz  #
+# homepage: github.com/pokornyv/SQUAD                          #
+# test_squad.py - regression tests against the baseline solver #
+# method described in                                          #
+#    Sci. Rep. 5, 8821 (2015).                                 #
+#    Phys. Rev. B 93, 024523 (2016).                           #
+################################################################
+
+## usage: python -m unittest test_squad
+## the options are set here, squad.in in the working directory does not change the results
+
+from squadsolver import *
+from tempfile import mkdtemp
+from shutil import rmtree
+import unittest
+
+#############################
+##### List of functions: ####
+# PinnedABSTest
+
+Options_test = {'rootf': 'brentq', 'ConvN': 1e-4, 'ConvX': 1e-5, 'ConvHF': 1e-6, 'MuMin': -2.0, 'MuMax': 2.0,\
+'ABSinit_val': 0.99, 'HF_max_iter': 10000, 'HFmethod': 'fixed_point', 'HFgrid': 'graded', 'HFpoints': 10001,\
+'offset_x': 1e-12, 'FFTbackend': 'numpy', 'Precision': 'double', 'KKpoles': 0, 'PHsymmetry': 1,\
+'chat': False, 'Write_HFGF': 0, 'Write_Bubble': 0, 'Write_2ndSE': 0, 'Write_2ndGF': 0,\
+'CacheDir': '', 'CheckpointDir': '', 'ProfFile': ''}
+
+
+class PinnedABSTest(unittest.TestCase):
+	""" ABS within dE of zero close to the 0-pi transition, U=1 Delta=1 GammaR=GammaL=0.5
+	    eps=0 P=0.999 on M=17 dE=1e-4. The baseline solver (fixed-point HF ABS energy,
+	    single root mirrored in FindABS) gives wABS 0, mu -0.02817, ResGa1 -0.24752, JC -0.24601 """
+
+	def Pinned(self,Guess = None,**Opts):
+		Options = dict(Options_test)
+		Options.update(Opts)
+		Solver = SquadSolver(PhysParams(1.0,1.0,0.5,0.5,0.0,0.999),EnergyGrid(17,1e-4),Options)
+		return Solver.Run(Guess = Guess)
+
+	def Previous(self,P = 0.966,**Opts):
+		""" the previous point of a phase sweep, P = 0.966, its ABS is within dE of zero too """
+		Options = dict(Options_test)
+		Options.update(Opts)
+		Solver = SquadSolver(PhysParams(1.0,1.0,0.5,0.5,0.0,P),EnergyGrid(17,1e-4),Options)
+		return Solver.Run()
+
+	def Check(self,Results):
+		self.assertLess(abs(Results['wzero']),1e-4)
+		self.assertAlmostEqual(Results['n'],0.5,places = 4)
+		self.assertAlmostEqual(Results['mu'],-0.02817,places = 4)
+		self.assertAlmostEqual(Results['JC'],-0.24601,places = 3)
+
+	def test_pinned(self):
+		self.Check(self.Pinned())
+
+	def test_pinned_nosymmetry(self):
+		self.Check(self.Pinned(PHsymmetry = 0))
+
+	def test_pinned_kkpoles(self):
+		self.Check(self.Pinned(KKpoles = 1))
+
+	def test_pinned_warm(self):
+		""" continuation from the previous point of a sweep gives the cold result """
+		[Cold,Warm] = [self.Pinned(),self.Pinned(Guess = self.Previous())]
+		self.Check(Warm)
+		for name in ['wzero','n','mu','JC']: self.assertEqual(Warm[name],Cold[name])
+
+	def test_pinned_cache_seed(self):
+		""" a cache seeded with nearby points of the sweep does not change the result """
+		cdir = mkdtemp()
+		try:
+			Cache_D = {'CacheDir': cdir, 'CacheSeed': 0.2}
+			for P in [0.9,0.966]: self.Previous(P,**Cache_D)
+			[Cold,Seeded] = [self.Pinned(),self.Pinned(**Cache_D)]
+		finally:
+			rmtree(cdir)
+		self.Check(Seeded)
+		for name in ['wzero','n','mu','JC']: self.assertEqual(Seeded[name],Cold[name])
+
+
+if __name__ == '__main__':
+	unittest.main()
+
+## test_squad.py end ##